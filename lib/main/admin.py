@@ -337,11 +337,13 @@ class JobAdmin(BaseModelAdmin):
                                       'get_result_stdout_display',
                                       'get_result_stderr_display',
                                       'get_result_traceback_display',
-                                      'celery_task_id')}),
+                                      'celery_task_id', 'inventory_render_time',
+                                      'host_summary_time')}),
     )
     readonly_fields = ('status', 'get_job_template_display',
                        'get_result_stdout_display', 'get_result_stderr_display',
                        'get_result_traceback_display', 'celery_task_id',
+                       'inventory_render_time', 'host_summary_time',
                        'creation_date', 'created_by', 'audit_trail',)
     filter_horizontal = ('tags',)
     form = JobAdminForm
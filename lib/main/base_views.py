@@ -21,17 +21,61 @@ from django.contrib.auth.models import User
 from lib.main.serializers import *
 from lib.main.rbac import *
 from django.core.exceptions import PermissionDenied
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from rest_framework import mixins
 from rest_framework import generics
 from rest_framework import permissions
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework import status
+from lib.main.custom_filters import log_slow_filter
+from lib.main.pagination import CursorPaginator
 import exceptions
+import calendar
 import datetime
+import hashlib
 import json as python_json
+import time
 
 # FIXME: machinery for auto-adding audit trail logs to all CREATE/EDITS
 
+def make_etag(request, *stamps):
+    '''
+    ETag for a response built from the given version stamps; responses vary
+    by user and query string, so those are part of it too.
+    '''
+    parts = [request.user.pk, request.get_full_path()] + list(stamps)
+    return hashlib.md5(repr(parts)).hexdigest()
+
+def is_not_modified(request, etag, last_modified=None):
+    ''' whether the client already has the current response (for a 304) '''
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', None)
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE', None)
+    if if_modified_since and last_modified is not None:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        return bool(if_modified_since) and \
+            calendar.timegm(last_modified.utctimetuple()) <= if_modified_since
+    return False
+
+def conditional_response(request, etag, last_modified, func):
+    '''
+    Return a 304 response if the client's copy is current, otherwise the
+    response from func(); both carry ETag and Last-Modified headers.
+    '''
+    if is_not_modified(request, etag, last_modified):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = func()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(calendar.timegm(last_modified.utctimetuple()))
+    return response
+
 class BaseList(generics.ListCreateAPIView):
 
     def list_permissions_check(self, request, obj=None):
@@ -61,13 +105,72 @@ class BaseList(generics.ListCreateAPIView):
         elif model in [ Tag, AuditTrail ]:
             qs = base
         else:
-            qs = self._get_queryset().filter(active=True)
+            qs = base.filter(active=True)
+        return qs
 
-        order = self.request.QUERY_PARAMS.get('order', None)
-        if order:
-            qs = qs.order_by(order)
+    # ordering_fields and max_filter_cost limit filtering together with
+    # filter_fields; see CustomFilterBackend.
+    max_filter_cost = 10
 
-        return qs
+    def list(self, request, *args, **kwargs):
+        start = time.time()
+        if CursorPaginator.cursor_param in request.QUERY_PARAMS:
+            func = lambda: self.cursor_list(request, *args, **kwargs)
+        else:
+            func = lambda: super(BaseList, self).list(request, *args, **kwargs)
+        stamps = self.get_collection_stamps()
+        if stamps is None:
+            response = func()
+        else:
+            # Lists are only compared by ETag: their latest modification time
+            # doesn't change when objects are removed or older ones are added.
+            response = conditional_response(request, make_etag(request, *stamps),
+                                            None, func)
+        log_slow_filter(self, time.time() - start)
+        return response
+
+    def get_collection_stamps(self):
+        '''
+        Stored version stamps that change whenever the list would, or None
+        for lists without them, which are never answered with a 304.
+        '''
+        return None
+
+    def cursor_list(self, request, *args, **kwargs):
+        '''
+        list using cursor pagination, requested by passing a 'cursor' (empty
+        for the first page); add skip_count=1 to leave out the total count.
+        '''
+        self.object_list = self.filter_queryset(self.get_queryset())
+        order_by = request.QUERY_PARAMS.get('order_by', None) or \
+                   request.QUERY_PARAMS.get('order', None)
+        page_size = self.get_paginate_by() or api_settings.PAGINATE_BY
+        try:
+            paginator = CursorPaginator(self.object_list, page_size, order_by)
+            objects, next_cursor, previous_cursor = paginator.page(
+                request.QUERY_PARAMS[CursorPaginator.cursor_param])
+        except ValueError, e:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'detail': str(e)})
+        count = None
+        if request.QUERY_PARAMS.get('skip_count', '') not in ('1', 'true', 'True'):
+            count = self.object_list.count()
+        serializer = self.get_serializer(objects, many=True)
+        return Response(dict(
+            count    = count,
+            next     = paginator.get_page_url(request, next_cursor),
+            previous = paginator.get_page_url(request, previous_cursor),
+            results  = serializer.data,
+        ))
+
+    def _filter_by_readable_inventory(self, base, field='inventory'):
+        '''
+        Limit base to objects in inventories the user can read; field is the
+        name of the inventory relation (or 'pk' for inventories themselves).
+        '''
+        if self.request.user.is_superuser:
+            return base.all()
+        readable_pks = Inventory.get_readable_pks(self.request.user)
+        return base.filter(**{'%s__in' % field: readable_pks})
 
 
 
@@ -76,6 +179,12 @@ class BaseSubList(BaseList):
 
     ''' used for subcollections with an overriden post '''
 
+    # Views of hosts or groups below an inventory or group may accept a list
+    # of items to create, attach or detach many objects at once (see
+    # bulk_post).
+    bulk_postable = False
+    max_bulk_items = 1000
+
     def list_permissions_check(self, request, obj=None):
         ''' determines some early yes/no access decisions, pre-filtering '''
         if request.method == 'GET':
@@ -85,6 +194,22 @@ class BaseSubList(BaseList):
              return True
         raise exceptions.NotImplementedError
 
+    def get_collection_stamps(self):
+        # Hosts and groups below an inventory or group change together with
+        # the version of the inventory (bumped when hosts, groups, their
+        # relations or variables change) or its modification time (bumped
+        # when job results of its hosts are saved).
+        model = self.__class__.model
+        parent_model = getattr(self.__class__, 'parent_model', None)
+        if model not in (Host, Group) or parent_model not in (Inventory, Group):
+            return None
+        if parent_model == Inventory:
+            qs = Inventory.objects.filter(pk=self.kwargs['pk'])
+        else:
+            qs = Inventory.objects.filter(groups__pk=self.kwargs['pk'])
+        stamps = list(qs.values_list('version', 'modified')[:1])
+        return list(stamps[0]) if stamps else None
+
 
     def post(self, request, *args, **kwargs):
 
@@ -93,8 +218,13 @@ class BaseSubList(BaseList):
             return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
         parent_id = kwargs['pk']
-        sub_id = request.DATA.get('id', None)
         main = self.__class__.parent_model.objects.get(pk=parent_id)
+        if isinstance(request.DATA, list):
+            if not getattr(self.__class__, 'bulk_postable', False):
+                return Response(status=status.HTTP_400_BAD_REQUEST,
+                                data=dict(detail='Only one object can be posted at a time'))
+            return self.bulk_post(request, main)
+        sub_id = request.DATA.get('id', None)
         severable = getattr(self.__class__, 'severable', True)
 
         subs = None
@@ -197,6 +327,132 @@ class BaseSubList(BaseList):
                 sub.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_parent_inventory(self, main):
+        ''' the inventory whose permissions apply to bulk changes below main '''
+        if isinstance(main, Inventory):
+            return main
+        return main.inventory
+
+    def bulk_post(self, request, main):
+        '''
+        Create, attach or detach many objects in one request, given a list of
+        items in the same format as single posts.  Write permission on the
+        inventory is checked once, objects and existing relations are looked
+        up with a query per chunk of IDs, and objects are attached or detached
+        with a single m2m change.  The response has a result for each item, in
+        request order, with the status a single post would have returned.
+        '''
+        items = request.DATA
+        if len(items) > self.max_bulk_items:
+            return Response(status=status.HTTP_400_BAD_REQUEST,
+                            data=dict(detail='At most %d objects can be posted at a time' % self.max_bulk_items))
+        inventory = self.get_parent_inventory(main)
+        if not Inventory._has_permission_types(request.user, inventory, PERMISSION_TYPES_ALLOWING_INVENTORY_WRITE):
+            raise PermissionDenied()
+        model = self.__class__.model
+        relationship = getattr(main, self.__class__.relationship)
+        severable = getattr(self.__class__, 'severable', True)
+        inject_primary_key = getattr(self.__class__, 'inject_primary_key_on_post_as', None)
+
+        results = [None] * len(items)
+        to_attach, to_detach, to_create = {}, {}, []
+        for n, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[n] = dict(status=status.HTTP_400_BAD_REQUEST, detail='Expected an object')
+                continue
+            sub_id = item.get('id', None)
+            if sub_id:
+                try:
+                    sub_id = int(sub_id)
+                except (TypeError, ValueError):
+                    results[n] = dict(status=status.HTTP_400_BAD_REQUEST, detail='Invalid ID')
+                    continue
+                if 'disassociate' in item:
+                    to_detach.setdefault(sub_id, []).append(n)
+                else:
+                    to_attach.setdefault(sub_id, []).append(n)
+            elif 'disassociate' in item:
+                results[n] = dict(status=status.HTTP_400_BAD_REQUEST, detail='ID is required to disassociate')
+            elif inject_primary_key is None:
+                results[n] = dict(status=status.HTTP_400_BAD_REQUEST, detail='Object cannot be created')
+            else:
+                to_create.append(n)
+
+        # Look up all referenced objects and which of them are already related.
+        ids = sorted(set(to_attach) | set(to_detach))
+        subs, related = {}, set()
+        for x in xrange(0, len(ids), 500):
+            chunk = ids[x:x + 500]
+            subs.update(model.objects.in_bulk(chunk))
+            related.update(relationship.filter(pk__in=chunk).values_list('pk', flat=True))
+        readable = None
+        if not request.user.is_superuser:
+            readable = Inventory.get_readable_pks(request.user) | set([inventory.pk])
+
+        def check(sub_id, indexes):
+            ''' set results for the items of sub_id, returning the object if usable '''
+            sub = subs.get(sub_id, None)
+            if sub is None:
+                result = dict(status=status.HTTP_404_NOT_FOUND, detail='Not found')
+            elif readable is not None and sub.inventory_id not in readable:
+                result = dict(status=status.HTTP_403_FORBIDDEN, detail='Permission denied')
+            elif sub == main:
+                result = dict(status=status.HTTP_400_BAD_REQUEST, detail='Cannot attach an object to itself')
+            else:
+                result = None
+            for n in indexes:
+                results[n] = result or dict(status=status.HTTP_204_NO_CONTENT, id=sub_id)
+            return result is None and sub or None
+
+        attached, detached = [], []
+        for sub_id, indexes in sorted(to_attach.items()):
+            sub = check(sub_id, indexes)
+            if sub is None:
+                continue
+            if sub_id in related:
+                for n in indexes:
+                    results[n] = dict(status=status.HTTP_409_CONFLICT, id=sub_id)
+                continue
+            attached.append(sub)
+            # repeated items conflict with the first one.
+            for n in indexes[1:]:
+                results[n] = dict(status=status.HTTP_409_CONFLICT, id=sub_id)
+        for sub_id, indexes in sorted(to_detach.items()):
+            sub = check(sub_id, indexes)
+            if sub is not None and sub_id in related:
+                detached.append(sub)
+        if attached:
+            relationship.add(*attached)
+        if detached:
+            if severable:
+                relationship.remove(*detached)
+            else:
+                # resources are just a ForeignKey, set them inactive instead
+                for sub in detached:
+                    sub.name   = "_deleted_%s_%s" % (str(datetime.time()), sub.name)
+                    sub.active = False
+                    sub.save()
+
+        created = []
+        for n in to_create:
+            data = dict(items[n].items())
+            data[inject_primary_key] = main.pk
+            data.setdefault('inventory', inventory.pk)
+            ser = self.__class__.serializer_class(data=data)
+            if not ser.is_valid():
+                results[n] = dict(status=status.HTTP_400_BAD_REQUEST, errors=ser.errors)
+            elif ser.object.inventory_id != inventory.pk:
+                results[n] = dict(status=status.HTTP_403_FORBIDDEN, detail='Permission denied')
+            else:
+                obj = ser.save()
+                created.append(obj)
+                results[n] = dict(status=status.HTTP_201_CREATED, id=obj.pk)
+        # objects created below a group are also added to it.
+        if created and hasattr(relationship, 'through'):
+            relationship.add(*created)
+
+        return Response(status=status.HTTP_200_OK, data=dict(results=results))
+
 
 class BaseDetail(generics.RetrieveUpdateDestroyAPIView):
 
@@ -204,6 +460,15 @@ class BaseDetail(generics.RetrieveUpdateDestroyAPIView):
         if type(obj) not in [ User, Tag, AuditTrail ]:
             obj.created_by = self.request.user
 
+    def retrieve(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        func = lambda: Response(self.get_serializer(self.object).data)
+        last_modified = getattr(self.object, 'modified', None)
+        if last_modified is None:
+            return func()
+        etag = make_etag(request, self.object.__class__.__name__, self.object.pk, last_modified)
+        return conditional_response(request, etag, last_modified, func)
+
     def destroy(self, request, *args, **kwargs):
         # somewhat lame that delete has to call it's own permissions check
         obj = self.model.objects.get(pk=kwargs['pk'])
@@ -14,37 +14,157 @@
 # You should have received a copy of the GNU General Public License
 # along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
 
-from rest_framework.filters import BaseFilterBackend
-from django.core.exceptions import PermissionDenied
+import logging
+from django.conf import settings
+from django.db.models.fields import BooleanField, FieldDoesNotExist
+from rest_framework.exceptions import ParseError
+from rest_framework.mixins import ListModelMixin
 
-# TODO: does order_by still work?
+logger = logging.getLogger('lib.main.custom_filters')
+
+# query parameters that are not filters (order_by is handled separately)
+RESERVED_PARAMS = [ 'page', 'page_size', 'cursor', 'skip_count', 'format',
+                    'fields', 'related', 'order_by' ]
+
+# lookups allowed for fields listed in a view's filter_fields as a tuple
+TEXT_LOOKUPS = ('exact', 'iexact', 'startswith', 'istartswith', 'icontains')
+
+# rough relative cost of each lookup on an indexed column; lookups that can't
+# use an index scan the whole table.
+LOOKUP_COSTS = {
+    'exact': 1, 'in': 1, 'isnull': 1,
+    'gt': 2, 'gte': 2, 'lt': 2, 'lte': 2, 'startswith': 2,
+    'iexact': 4, 'istartswith': 4,
+    'contains': 10, 'icontains': 10, 'endswith': 10, 'iendswith': 10,
+}
+UNINDEXED_COST = 5   # added when the field has no index
+JOIN_COST      = 3   # added for each relation followed
 
 class CustomFilterBackend(object):
+    '''
+    Filters and orders list views from query parameters, limited to what each
+    view declares:
+
+      filter_fields   -- field names (allowing TEXT_LOOKUPS) or a dict mapping
+                         field names to the lookups allowed on them,
+                         e.g. ?name__icontains=web or ?inventory__in=1,2
+      ordering_fields -- fields allowed in ?order_by= (optionally prefixed
+                         with '-'); defaults to id plus the filter fields.
+      max_filter_cost -- the total estimated cost (see LOOKUP_COSTS) allowed
+                         for the filters and ordering of one request.
+
+    Anything else is rejected with a 400 response, including any filter on
+    list views which declare no filter_fields.  Detail views aren't filtered,
+    and their query parameters are ignored.
+    '''
+
+    def get_filter_spec(self, view):
+        spec = getattr(view, 'filter_fields', None) or {}
+        if not isinstance(spec, dict):
+            spec = dict((field, TEXT_LOOKUPS) for field in spec)
+        return spec
+
+    def get_ordering_fields(self, view):
+        ordering = getattr(view, 'ordering_fields', None)
+        if ordering is None:
+            ordering = ['id'] + [f for f in self.get_filter_spec(view) if '__' not in f]
+        return ordering
+
+    def is_boolean_field(self, model, name):
+        try:
+            return isinstance(model._meta.get_field(name), BooleanField)
+        except FieldDoesNotExist:
+            return False
+
+    def field_cost(self, model, path):
+        ''' cost of looking up a field path, following relations as needed '''
+        cost = 0
+        parts = path.split('__')
+        for n, part in enumerate(parts):
+            if part == 'pk':
+                part = model._meta.pk.name
+            try:
+                field, field_model, direct, m2m = model._meta.get_field_by_name(part)
+            except FieldDoesNotExist:
+                raise ParseError('Invalid filter field: %s' % path)
+            if direct and not m2m and not field.rel:
+                indexed = field.primary_key or field.unique or field.db_index
+                if n != len(parts) - 1:
+                    raise ParseError('Invalid filter field: %s' % path)
+                return cost + (0 if indexed else UNINDEXED_COST)
+            if direct:
+                related_model = field.rel.to
+            else:
+                related_model = field.model
+            # a foreign key column itself is indexed; anything else is a join.
+            if n == len(parts) - 1 and direct and not m2m:
+                return cost
+            cost += JOIN_COST
+            model = related_model
+        return cost
 
     def filter_queryset(self, request, queryset, view):
 
-        keys = request.GET.keys()
+        if not isinstance(view, ListModelMixin):
+            return queryset
+
+        spec = self.get_filter_spec(view)
+        model = queryset.model
 
         terms = {}
         order_by = None
+        cost = 0
+        descriptions = []
 
-        for key in keys:
+        for key in request.GET.keys():
 
             value = request.GET[key]
 
-            if key in [ 'page', 'page_size' ]:
+            if key in [ 'order_by', 'order' ]:
+               order_by = value
                continue
 
-            if key == 'order_by':
-               order_by = value
+            if key in RESERVED_PARAMS:
                continue
 
             key2 = key
             if key2.endswith("__int"):
                key2 = key.replace("__int","")
-               value = int(value)
+               try:
+                   value = int(value)
+               except ValueError:
+                   raise ParseError('Invalid value for %s' % key)
 
+            field, lookup = key2, 'exact'
+            if '__' in key2 and key2.rsplit('__', 1)[1] in LOOKUP_COSTS:
+                field, lookup = key2.rsplit('__', 1)
+            if field not in spec:
+                raise ParseError('Filtering on %s is not allowed' % field)
+            if lookup not in spec[field]:
+                raise ParseError('Lookup %s is not allowed on %s' % (lookup, field))
+            if lookup == 'in':
+                value = value.split(',')
+            elif lookup == 'isnull' or (lookup == 'exact' and
+                                         self.is_boolean_field(model, field)):
+                value = value.lower() in ('1', 'true')
+            cost += LOOKUP_COSTS[lookup] + self.field_cost(model, field)
             terms[key2] = value
+            descriptions.append(key2)
+
+        if order_by:
+           field = order_by.lstrip('-')
+           if field not in self.get_ordering_fields(view):
+               raise ParseError('Ordering by %s is not allowed' % field)
+           cost += 1 + self.field_cost(model, field)
+           descriptions.append('order_by=%s' % order_by)
+
+        max_cost = getattr(view, 'max_filter_cost', None)
+        if max_cost is not None and cost > max_cost:
+            raise ParseError('Filters are too expensive (cost %d, %d allowed); '
+                             'use fewer or more selective filters' % (cost, max_cost))
+
+        # remembered so that the view can log filters that turn out to be slow.
+        view.filter_description = descriptions
 
         qs = queryset.filter(**terms)
 
@@ -52,3 +172,12 @@ class CustomFilterBackend(object):
            qs = qs.order_by(order_by)
 
         return qs
+
+def log_slow_filter(view, elapsed):
+    ''' log filter combinations that took longer than API_SLOW_FILTER_THRESHOLD '''
+    threshold = getattr(settings, 'API_SLOW_FILTER_THRESHOLD', None)
+    descriptions = getattr(view, 'filter_description', None)
+    if not threshold or not descriptions or elapsed * 1000 < threshold:
+        return
+    logger.warning('Slow filter on %s (%.0f ms): %s', view.__class__.__name__,
+                   elapsed * 1000, ', '.join(sorted(descriptions)))
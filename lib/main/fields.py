@@ -0,0 +1,232 @@
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Compact storage for large JSON documents (e.g. job event data).  Values are
+stored as JSON text, or zlib compressed (and base64 encoded, to remain valid
+text) when they are large enough to benefit.  Large sub-documents repeated
+between values, such as facts, can be replaced by references to separately
+stored copies (see split_documents and expand_documents).
+'''
+
+import base64
+import hashlib
+import json
+import zlib
+from django.db import models
+
+__all__ = ['CompressedJSONField', 'encode_json', 'decode_json',
+           'split_documents', 'expand_documents', 'DOCUMENT_REF_KEY']
+
+COMPRESSED_PREFIX = 'zlib:'
+
+# Key of the single item in the objects that replace sub-documents.
+DOCUMENT_REF_KEY = '__document__'
+
+def encode_json(value, compress_size=256):
+    '''
+    Serialize value as JSON, compressed when the JSON is at least
+    compress_size bytes long.
+    '''
+    data = json.dumps(value, separators=(',', ':'))
+    if len(data) < compress_size:
+        return data
+    return COMPRESSED_PREFIX + base64.b64encode(zlib.compress(data))
+
+def decode_json(data):
+    '''
+    Return the value of JSON text (compressed or not) as returned by
+    encode_json.  Text which isn't valid JSON is returned as is.
+    '''
+    if not data:
+        return data
+    if data.startswith(COMPRESSED_PREFIX):
+        data = zlib.decompress(base64.b64decode(data[len(COMPRESSED_PREFIX):]))
+    try:
+        return json.loads(data)
+    except ValueError:
+        return data
+
+def split_documents(value, min_size):
+    '''
+    Replace the dicts and lists nested in value whose JSON is at least
+    min_size bytes long with references, innermost first.  Return the new
+    value and a dict of the replaced documents by checksum.  Keys aren't
+    sorted when computing checksums (which is much slower), so equal documents
+    built in a different order may be stored twice.
+    '''
+    documents = {}
+
+    def split(value, nested):
+        if not isinstance(value, (dict, list, tuple)):
+            return value
+        data = json.dumps(value, separators=(',', ':'))
+        if len(data) < min_size:
+            return value
+        items = value.values() if isinstance(value, dict) else value
+        if not any(isinstance(v, (dict, list, tuple)) for v in items):
+            result = value
+        elif isinstance(value, dict):
+            result = dict((k, split(v, True)) for k, v in value.iteritems())
+        else:
+            result = [split(v, True) for v in value]
+        if not nested:
+            return result
+        if result is not value:
+            data = json.dumps(result, separators=(',', ':'))
+            if len(data) < min_size:
+                return result
+        checksum = hashlib.sha1(data).hexdigest()
+        documents[checksum] = result
+        return {DOCUMENT_REF_KEY: checksum}
+
+    if not min_size:
+        return value, documents
+    return split(value, False), documents
+
+def find_document_refs(value, refs=None):
+    ''' return the set of checksums of references in value '''
+    if refs is None:
+        refs = set()
+    if isinstance(value, dict):
+        if len(value) == 1 and DOCUMENT_REF_KEY in value:
+            refs.add(value[DOCUMENT_REF_KEY])
+        else:
+            for v in value.itervalues():
+                find_document_refs(v, refs)
+    elif isinstance(value, list):
+        for v in value:
+            find_document_refs(v, refs)
+    return refs
+
+def expand_documents(value, get_documents):
+    '''
+    Replace references in value by the documents they refer to.
+    get_documents is called with a set of checksums and returns a dict of the
+    documents found; references to missing documents are left in place.
+    '''
+    documents = {}
+    refs = find_document_refs(value)
+    while refs:
+        found = get_documents(refs)
+        documents.update(found)
+        # Documents may contain references to smaller ones themselves.
+        refs = set()
+        for document in found.itervalues():
+            find_document_refs(document, refs)
+        refs.difference_update(documents)
+
+    def expand(value):
+        if isinstance(value, dict):
+            if len(value) == 1 and value.get(DOCUMENT_REF_KEY, None) in documents:
+                return expand(documents[value[DOCUMENT_REF_KEY]])
+            return dict((k, expand(v)) for k, v in value.iteritems())
+        elif isinstance(value, list):
+            return [expand(v) for v in value]
+        return value
+
+    if not documents:
+        return value
+    return expand(value)
+
+class LazyJSONDescriptor(object):
+    '''
+    Keep the stored text of a CompressedJSONField and decode it the first
+    time the value is used.
+    '''
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        name = self.field.attname
+        if name not in instance.__dict__:
+            value = decode_json(instance.__dict__.pop(self.field.encoded_attname, ''))
+            expand = getattr(instance, 'expand_%s' % name, None)
+            if expand:
+                value = expand(value)
+            instance.__dict__[name] = value
+        return instance.__dict__[name]
+
+    def __set__(self, instance, value):
+        # The first value set (by Model.__init__, when loading from the
+        # database) and compressed text are stored text; other strings are
+        # values like any other.
+        initial = self.field.attname not in instance.__dict__ and \
+                  self.field.encoded_attname not in instance.__dict__
+        if isinstance(value, basestring) and \
+           (initial or value.startswith(COMPRESSED_PREFIX)):
+            instance.__dict__[self.field.encoded_attname] = value
+            instance.__dict__.pop(self.field.attname, None)
+        else:
+            instance.__dict__[self.field.attname] = value
+            instance.__dict__.pop(self.field.encoded_attname, None)
+
+class CompressedJSONField(models.TextField):
+    '''
+    A JSON field stored as compressed text (see encode_json), decoded only
+    when the value is used.  If the model has an expand_<name> method, values
+    are passed through it after decoding (e.g. to expand references).
+    '''
+
+    description = 'JSON object, compressed'
+
+    def __init__(self, *args, **kwargs):
+        self.compress_size = kwargs.pop('compress_size', 256)
+        super(CompressedJSONField, self).__init__(*args, **kwargs)
+
+    def contribute_to_class(self, cls, name):
+        super(CompressedJSONField, self).contribute_to_class(cls, name)
+        self.encoded_attname = '_%s_encoded' % self.attname
+        setattr(cls, self.attname, LazyJSONDescriptor(self))
+
+    def set_encoded(self, instance, data):
+        '''
+        Set the text to store for the current value of the field of
+        instance, e.g. after replacing sub-documents with references.
+        '''
+        instance.__dict__[self.encoded_attname] = data
+
+    def pre_save(self, model_instance, add):
+        # Values which haven't been decoded are stored again as they were.
+        data = model_instance.__dict__.get(self.encoded_attname, None)
+        if data is not None:
+            return data
+        value = getattr(model_instance, self.attname)
+        if value is None:
+            return value
+        return encode_json(value, self.compress_size)
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, basestring):
+            return value
+        return encode_json(value, self.compress_size)
+
+    def to_python(self, value):
+        if isinstance(value, basestring):
+            return decode_json(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(self.pre_save(obj, False))
+
+try:
+    from south.modelsinspector import add_introspection_rules
+    add_introspection_rules([], ['^lib\.main\.fields\.CompressedJSONField'])
+except ImportError:
+    pass
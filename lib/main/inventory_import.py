@@ -0,0 +1,409 @@
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Loading ansible inventories (INI or YAML files, or the output of inventory
+scripts) and merging them into an inventory with batched queries.
+
+Loaders return a (hosts, groups) tuple, where hosts maps each host name to
+its variables and groups maps each group name to a dictionary with 'vars',
+'hosts' (a set of host names) and 'children' (a set of group names).
+'''
+
+import json
+import os
+import re
+import shlex
+import subprocess
+import time
+import uuid
+import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+from django.db import transaction
+from django.db.models import F
+from django.utils.datastructures import SortedDict
+from django.utils.timezone import now
+from lib.main.models import Inventory, Host, Group, GroupClosure, VariableData
+
+__all__ = ['load_ini', 'load_yaml', 'load_script_data', 'load_inventory_source',
+           'InventoryImport']
+
+# A range of numbers or letters in a host name, as in www[01:50].example.com.
+HOST_RANGE_RE = re.compile(r'^(.*?)\[([0-9a-zA-Z]+):([0-9a-zA-Z]+)\](.*)$')
+
+# A port number following a host name, as in db.example.com:5432.
+HOST_PORT_RE = re.compile(r'^(.*[^\]]):(\d+)$')
+
+# Number of objects per query when filtering or updating by primary key.
+CHUNK_SIZE = 500
+
+def expand_host_range(pattern):
+    '''
+    Return the host names matching a pattern which may contain ranges.
+    '''
+    match = HOST_RANGE_RE.match(pattern)
+    if not match:
+        return [pattern]
+    head, beg, end, tail = match.groups()
+    if beg.isdigit() and end.isdigit():
+        seq = ['%0*d' % (len(beg), x) for x in xrange(int(beg), int(end) + 1)]
+    elif len(beg) == 1 and len(end) == 1 and beg.isalpha() and end.isalpha():
+        seq = [chr(x) for x in xrange(ord(beg), ord(end) + 1)]
+    else:
+        raise ValueError('Invalid host range: %s' % pattern)
+    names = []
+    for item in seq:
+        names.extend(expand_host_range(head + item + tail))
+    return names
+
+def _add_group(groups, name):
+    return groups.setdefault(name, {'vars': {}, 'hosts': set(),
+                                    'children': set()})
+
+def _add_children(groups, name, children):
+    # Child groups only named in the hierarchy are created too.
+    group = _add_group(groups, name)
+    for child in children:
+        _add_group(groups, child)
+        group['children'].add(child)
+
+def load_ini(content):
+    '''
+    Load an ansible INI inventory file.
+    '''
+    hosts, groups = {}, {}
+    group, kind = None, 'hosts'
+    for lineno, line in enumerate(content.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#') or line.startswith(';'):
+            continue
+        if line.startswith('['):
+            if not line.endswith(']'):
+                raise ValueError('Invalid section on line %d' % lineno)
+            name, kind = line[1:-1].strip(), 'hosts'
+            if ':' in name:
+                name, kind = name.rsplit(':', 1)
+                if kind not in ('vars', 'children'):
+                    raise ValueError('Invalid section on line %d' % lineno)
+            group = _add_group(groups, name)
+        elif kind == 'vars':
+            if '=' not in line:
+                raise ValueError('Invalid variable on line %d' % lineno)
+            key, value = line.split('=', 1)
+            group['vars'][key.strip()] = value.strip()
+        elif kind == 'children':
+            _add_children(groups, name, [line])
+        else:
+            try:
+                tokens = shlex.split(line)
+            except ValueError:
+                raise ValueError('Invalid host on line %d' % lineno)
+            host_vars = {}
+            for token in tokens[1:]:
+                if '=' not in token:
+                    raise ValueError('Invalid variable on line %d' % lineno)
+                key, value = token.split('=', 1)
+                host_vars[key] = value
+            pattern = tokens[0]
+            match = HOST_PORT_RE.match(pattern)
+            if match:
+                pattern = match.group(1)
+                host_vars['ansible_ssh_port'] = int(match.group(2))
+            for host_name in expand_host_range(pattern):
+                hosts.setdefault(host_name, {}).update(host_vars)
+                if group is not None:
+                    group['hosts'].add(host_name)
+    return hosts, groups
+
+def _vars_dict(value):
+    # Variables may be given as a dictionary or as a list of dictionaries.
+    if value is None:
+        return {}
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        result = {}
+        for item in value:
+            if not isinstance(item, dict):
+                raise ValueError('Invalid variables: %r' % (item,))
+            result.update(item)
+        return result
+    raise ValueError('Invalid variables: %r' % (value,))
+
+def load_script_data(data, get_host_vars=None):
+    '''
+    Load the data returned by an inventory script called with --list.  When
+    host variables are not included under _meta.hostvars, they are requested
+    from get_host_vars(host_name) if given.
+    '''
+    if not isinstance(data, dict):
+        raise ValueError('Inventory data must be a dictionary')
+    hosts, groups = {}, {}
+    for name, info in data.items():
+        if name == '_meta':
+            continue
+        if isinstance(info, list):
+            info = {'hosts': info}
+        elif not isinstance(info, dict):
+            raise ValueError('Invalid group: %s' % name)
+        group = _add_group(groups, name)
+        group['vars'].update(_vars_dict(info.get('vars', None)))
+        for host_name in info.get('hosts', None) or []:
+            hosts.setdefault(host_name, {})
+            group['hosts'].add(host_name)
+        _add_children(groups, name, info.get('children', None) or [])
+    meta = data.get('_meta', None)
+    if isinstance(meta, dict) and 'hostvars' in meta:
+        for host_name, host_vars in (meta['hostvars'] or {}).items():
+            hosts.setdefault(host_name, {}).update(_vars_dict(host_vars))
+    elif get_host_vars is not None:
+        for host_name in hosts:
+            hosts[host_name].update(_vars_dict(get_host_vars(host_name)))
+    return hosts, groups
+
+def load_yaml(content):
+    '''
+    Load a YAML inventory file, either in the same format as the output of an
+    inventory script or as a list of host and group entries.
+    '''
+    try:
+        data = yaml.load(content, Loader=SafeLoader)
+    except yaml.YAMLError, e:
+        raise ValueError('Invalid YAML: %s' % e)
+    if isinstance(data, dict):
+        return load_script_data(data)
+    if not isinstance(data, list):
+        raise ValueError('Inventory data must be a list or a dictionary')
+    hosts, groups = {}, {}
+    for item in data:
+        if not isinstance(item, dict):
+            raise ValueError('Invalid inventory entry: %r' % (item,))
+        if 'host' in item:
+            hosts.setdefault(item['host'], {}).update(_vars_dict(item.get('vars', None)))
+        elif 'group' in item:
+            group = _add_group(groups, item['group'])
+            group['vars'].update(_vars_dict(item.get('vars', None)))
+            for host in item.get('hosts', None) or []:
+                if isinstance(host, dict):
+                    host_name = host.get('host', None)
+                    if host_name is None:
+                        raise ValueError('Invalid host: %r' % (host,))
+                    host_vars = _vars_dict(host.get('vars', None))
+                else:
+                    host_name, host_vars = host, {}
+                hosts.setdefault(host_name, {}).update(host_vars)
+                group['hosts'].add(host_name)
+            _add_children(groups, item['group'], item.get('children', None) or [])
+        else:
+            raise ValueError('Invalid inventory entry: %r' % (item,))
+    return hosts, groups
+
+def _run_script(path, *args):
+    proc = subprocess.Popen([path] + list(args), stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise ValueError('%s failed: %s' % (path, stderr.strip()))
+    try:
+        return json.loads(stdout)
+    except ValueError:
+        raise ValueError('%s did not return valid JSON' % path)
+
+def load_inventory_source(path):
+    '''
+    Load an inventory from a file or an executable inventory script.
+    '''
+    if os.access(path, os.X_OK):
+        get_host_vars = lambda name: _run_script(path, '--host', name)
+        return load_script_data(_run_script(path, '--list'), get_host_vars)
+    content = file(path).read()
+    if content.lstrip().startswith('{'):
+        try:
+            return load_script_data(json.loads(content))
+        except ValueError:
+            pass
+    if os.path.splitext(path)[-1] in ('.yml', '.yaml'):
+        return load_yaml(content)
+    return load_ini(content)
+
+class InventoryImport(object):
+    '''
+    Merge hosts, groups, group hierarchy and variables into an inventory
+    within one transaction.  New rows are added with bulk inserts, and only
+    changed rows are updated; nothing is removed from the inventory.
+
+    Bulk queries don't send the signals normally keeping the inventory
+    version, group closure and modification times up to date, so those are
+    updated here once the import is done.
+    '''
+
+    def __init__(self, inventory, overwrite_vars=False):
+        self.inventory = inventory
+        self.overwrite_vars = overwrite_vars
+        self.counts = SortedDict()
+        self.timings = []
+        self.changed_hosts = set()
+        self.changed_groups = set()
+
+    def timed(self, label, func, *args):
+        start = time.time()
+        result = func(*args)
+        self.timings.append((label, time.time() - start))
+        return result
+
+    def merge_vars(self, data, new_vars):
+        ''' return the new JSON variable data, or None if unchanged '''
+        try:
+            old_vars = json.loads(data) if data else {}
+        except ValueError:
+            old_vars = {}
+        if self.overwrite_vars:
+            merged = dict(new_vars)
+        else:
+            merged = dict(old_vars.items() + new_vars.items())
+        if merged == old_vars:
+            return None
+        return json.dumps(merged)
+
+    def create_variable_data(self, datas):
+        '''
+        Insert a VariableData row for each JSON string, returning their pks in
+        the same order.  Rows are inserted with a temporary unique name to
+        find their pks afterwards.
+        '''
+        if not datas:
+            return []
+        token = uuid.uuid4().hex
+        VariableData.objects.bulk_create([
+            VariableData(name='%s-%d' % (token, n), data=data)
+            for n, data in enumerate(datas)
+        ])
+        qs = VariableData.objects.filter(name__startswith=token)
+        pks = dict(qs.values_list('name', 'pk'))
+        qs.update(name='')
+        return [pks['%s-%d' % (token, n)] for n in xrange(len(datas))]
+
+    def merge_objects(self, model, wanted, changed):
+        '''
+        Create or update objects of the model (Host or Group) from a mapping
+        of names to variables, returning the pks of all objects by name.
+        '''
+        existing = {}
+        for pk, name, vd_pk, data in model.objects.filter(
+                inventory=self.inventory).values_list('pk', 'name',
+                'variable_data', 'variable_data__data'):
+            existing[name] = (pk, vd_pk, data)
+        new_vars, new_links, updated_data = [], [], []
+        for name, obj_vars in sorted(wanted.items()):
+            if name not in existing:
+                if obj_vars:
+                    new_vars.append((name, json.dumps(obj_vars)))
+                continue
+            pk, vd_pk, data = existing[name]
+            data = self.merge_vars(data, obj_vars)
+            if data is None:
+                continue
+            if vd_pk is None:
+                new_links.append((pk, data))
+            else:
+                updated_data.append((vd_pk, data))
+            changed.add(pk)
+        vd_pks = self.create_variable_data([x[1] for x in new_vars + new_links])
+        new_vd_pks = dict(zip([x[0] for x in new_vars], vd_pks))
+        new_names = sorted(set(wanted) - set(existing))
+        model.objects.bulk_create([
+            model(name=name, inventory=self.inventory,
+                  variable_data_id=new_vd_pks.get(name, None))
+            for name in new_names
+        ])
+        for (pk, data), vd_pk in zip(new_links, vd_pks[len(new_vars):]):
+            model.objects.filter(pk=pk).update(variable_data=vd_pk)
+        for vd_pk, data in updated_data:
+            VariableData.objects.filter(pk=vd_pk).update(data=data)
+        label = unicode(model._meta.verbose_name_plural)
+        self.counts['%s created' % label] = len(new_names)
+        self.counts['%s updated' % label] = len(new_links) + len(updated_data)
+        return dict(model.objects.filter(inventory=self.inventory).values_list('name', 'pk'))
+
+    def merge_relations(self, through, fields, lookup, wanted):
+        '''
+        Insert the (from pk, to pk) pairs missing from a through table,
+        returning the pairs inserted.
+        '''
+        existing = set(through.objects.filter(**{lookup: self.inventory}).values_list(*fields))
+        missing = sorted(wanted - existing)
+        through.objects.bulk_create([through(**dict(zip(fields, pair))) for pair in missing])
+        return missing
+
+    def merge_memberships(self, host_pks, group_pks, groups):
+        wanted = set()
+        for name, info in groups.items():
+            for host_name in info['hosts']:
+                wanted.add((group_pks[name], host_pks[host_name]))
+        added = self.merge_relations(Group.hosts.through,
+                                     ('group_id', 'host_id'),
+                                     'group__inventory', wanted)
+        self.changed_groups.update(x[0] for x in added)
+        self.changed_hosts.update(x[1] for x in added)
+        self.counts['group hosts added'] = len(added)
+
+    def merge_hierarchy(self, group_pks, groups):
+        wanted = set()
+        for name, info in groups.items():
+            for child in info['children']:
+                wanted.add((group_pks[child], group_pks[name]))
+        added = self.merge_relations(Group.parents.through,
+                                     ('from_group_id', 'to_group_id'),
+                                     'from_group__inventory', wanted)
+        for pair in added:
+            self.changed_groups.update(pair)
+        self.counts['group children added'] = len(added)
+        # New groups also need to be paired with themselves.
+        GroupClosure.rebuild(self.inventory.pk)
+
+    def update_modified(self):
+        timestamp = now()
+        for model, pks in ((Host, self.changed_hosts), (Group, self.changed_groups)):
+            pks = sorted(pks)
+            for n in xrange(0, len(pks), CHUNK_SIZE):
+                model.objects.filter(pk__in=pks[n:n + CHUNK_SIZE]).update(modified=timestamp)
+        Inventory.objects.filter(pk=self.inventory.pk).update(
+            version=F('version') + 1, modified=timestamp)
+
+    def run(self, hosts, groups):
+        '''
+        Merge the hosts and groups returned by a loader into the inventory.
+        '''
+        # Hosts only named in groups are created without variables.
+        hosts = dict(hosts.items())
+        for info in groups.values():
+            for host_name in info['hosts']:
+                hosts.setdefault(host_name, {})
+        with transaction.commit_on_success():
+            host_pks = self.timed('hosts', self.merge_objects, Host,
+                                  hosts, self.changed_hosts)
+            group_vars = dict((k, v['vars']) for k, v in groups.items())
+            group_pks = self.timed('groups', self.merge_objects, Group,
+                                   group_vars, self.changed_groups)
+            self.timed('group hosts', self.merge_memberships, host_pks,
+                       group_pks, groups)
+            self.timed('group children', self.merge_hierarchy, group_pks,
+                       groups)
+            self.timed('modification times', self.update_modified)
+        return self.counts
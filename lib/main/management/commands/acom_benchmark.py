@@ -0,0 +1,134 @@
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import now
+
+class Command(BaseCommand):
+    '''
+    Microbenchmarks for code paths that run once per object in API responses.
+    '''
+
+    args = '<benchmark benchmark ...>'
+    help = 'Run Ansible Commander microbenchmarks (available: urls, event_data)'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--count', dest='count', type='int', default=500,
+                    help='Number of objects per iteration (default 500)'),
+        make_option('-r', '--repeat', dest='repeat', type='int', default=5,
+                    help='Number of iterations, best time is reported '
+                         '(default 5)'),
+    )
+
+    def timeit(self, func, repeat):
+        best = None
+        for x in xrange(repeat):
+            start = time.time()
+            func()
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best
+
+    def report(self, label, elapsed, count):
+        self.stdout.write('%-40s %10.1f usec/object\n' % (label, elapsed * 1000000.0 / count))
+
+    def benchmark_urls(self, count, repeat):
+        ''' serialize groups (url and six related links each) with and without URL templates '''
+        import lib.urls
+        from lib.main.models import Group
+        from lib.main.serializers import GroupSerializer
+        import lib.main.url_templates as url_templates
+        creation_date = now()
+        groups = [Group(pk=x + 1, name='group-%d' % x, inventory_id=1,
+                        created_by_id=1, creation_date=creation_date)
+                  for x in xrange(count)]
+        serialize = lambda: GroupSerializer(groups, many=True).data
+        url_templates.get_url_templates()
+        with_templates = self.timeit(serialize, repeat)
+        saved, url_templates._url_templates = url_templates._url_templates, {}
+        try:
+            with_reverse = self.timeit(serialize, repeat)
+        finally:
+            url_templates._url_templates = saved
+        self.report('GroupSerializer, reverse()', with_reverse, count)
+        self.report('GroupSerializer, URL templates', with_templates, count)
+
+    def benchmark_event_data(self, count, repeat):
+        ''' store job events (with facts and package lists) as plain JSON and compressed '''
+        from django.db import transaction
+        from django.test.utils import override_settings
+        from lib.main.models import Job, JobEvent, JobEventDocument
+        packages = ['package-%d-1.%d.%d' % (x, x % 7, x % 3) for x in xrange(300)]
+        event_data = []
+        for x in xrange(count):
+            host = 'host-%d' % (x % 20)
+            if x % 3 == 0:
+                facts = dict(('ansible_fact_%d' % y, '%s value %d' % (host, y))
+                             for y in xrange(150))
+                res = {'changed': False, 'ansible_facts': facts}
+            elif x % 3 == 1:
+                res = {'changed': False, 'results': packages}
+            else:
+                res = {'changed': True, 'cmd': 'uptime', 'rc': 0,
+                       'stdout': '%s up %d days, load average: 0.00' % (host, x)}
+            event_data.append({'host': host, 'res': res})
+
+        jobs = []
+
+        def store():
+            jobs.append(Job.objects.create(name='benchmark %d' % len(jobs)))
+            job_events = [JobEvent(job=jobs[-1], event='runner_on_ok', event_data=v)
+                          for v in event_data]
+            JobEvent.prepare_event_data(job_events)
+            JobEvent.objects.bulk_create(job_events)
+
+        def size():
+            return sum(len(data) for data in
+                       jobs[-1].job_events.values_list('event_data', flat=True))
+
+        # Nothing is kept: everything is rolled back at the end.
+        transaction.enter_transaction_management()
+        transaction.managed(True)
+        try:
+            with override_settings(JOB_EVENT_DATA_COMPRESSION=False):
+                plain = self.timeit(store, repeat)
+                plain_size = size()
+            compressed = self.timeit(store, repeat)
+            compressed_size = size()
+            documents = JobEventDocument.objects.values_list('checksum', 'data')
+            documents_size = sum(len(c) + len(d) for c, d in documents)
+        finally:
+            transaction.rollback()
+            transaction.leave_transaction_management()
+        self.report('JobEvent insert, plain JSON', plain, count)
+        self.report('JobEvent insert, compressed', compressed, count)
+        self.stdout.write('%-40s %10.1f bytes/object\n' % ('JobEvent data, plain JSON',
+                                                            plain_size / float(count)))
+        self.stdout.write('%-40s %10.1f bytes/object (+ %d bytes of documents)\n' %
+                          ('JobEvent data, compressed', compressed_size / float(count),
+                           documents_size))
+
+    def handle(self, *args, **options):
+        count = options.get('count') or 500
+        repeat = options.get('repeat') or 5
+        for name in (args or ['urls']):
+            benchmark = getattr(self, 'benchmark_%s' % name, None)
+            if benchmark is None:
+                raise CommandError('Unknown benchmark: %s' % name)
+            benchmark(count, repeat)
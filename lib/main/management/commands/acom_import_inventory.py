@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+import os
+import time
+from django.core.management.base import NoArgsCommand, CommandError
+
+class Command(NoArgsCommand):
+    '''
+    Merge hosts, groups and variables from an ansible inventory file or an
+    inventory script into an inventory.
+    '''
+
+    help = 'Import an ansible INI/YAML inventory file or inventory script ' \
+           'into an inventory'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('-i', '--inventory', dest='inventory_id', type='int',
+                    default=0, help='Inventory ID to import into'),
+        make_option('--source', dest='source', default='',
+                    help='Inventory file, or executable inventory script'),
+        make_option('--overwrite-vars', action='store_true',
+                    dest='overwrite_vars', default=False,
+                    help='Replace existing variables of hosts and groups '
+                         'instead of merging them'),
+    )
+
+    def handle_noargs(self, **options):
+        from lib.main.models import Inventory
+        from lib.main.inventory_import import load_inventory_source, InventoryImport
+        inventory_id = options.get('inventory_id', 0)
+        if not inventory_id:
+            raise CommandError('No inventory ID specified')
+        try:
+            inventory = Inventory.objects.get(id=inventory_id)
+        except Inventory.DoesNotExist:
+            raise CommandError('Inventory with ID %d not found' % inventory_id)
+        source = options.get('source', '')
+        if not source:
+            raise CommandError('No inventory source specified')
+        if not os.path.isfile(source):
+            raise CommandError('Inventory source %s not found' % source)
+        start = time.time()
+        try:
+            hosts, groups = load_inventory_source(source)
+        except (ValueError, OSError, IOError), e:
+            raise CommandError('Unable to load %s: %s' % (source, e))
+        self.stdout.write('Loaded %d hosts and %d groups from %s in %.2f '
+                          'seconds\n' % (len(hosts), len(groups), source,
+                                         time.time() - start))
+        importer = InventoryImport(inventory, options.get('overwrite_vars', False))
+        counts = importer.run(hosts, groups)
+        for label, elapsed in importer.timings:
+            self.stdout.write('%-20s %8.2f seconds\n' % (label, elapsed))
+        for label, count in counts.items():
+            self.stdout.write('%-20s %8d\n' % (label, count))
+
+if __name__ == '__main__':
+    from __init__ import run_command_as_script
+    command_name = os.path.splitext(os.path.basename(__file__))[0]
+    run_command_as_script(command_name)
@@ -39,22 +39,8 @@ class Command(NoArgsCommand):
     )
 
     def get_list(self, inventory, indent=None):
-        groups = {}
-        for group in inventory.groups.all():
-            # FIXME: Check if group is active?
-            group_info = {
-                'hosts': list(group.hosts.values_list('name', flat=True)),
-                'children': list(group.children.values_list('name', flat=True)),
-            }
-            if group.variable_data is not None:
-                group_info['vars'] = json.loads(group.variable_data.data)
-
-            group_info = dict(filter(lambda x: bool(x[1]), group_info.items()))
-            if group_info.keys() in ([], ['hosts']):
-                groups[group.name] = group_info.get('hosts', [])
-            else:
-                groups[group.name] = group_info
-        self.stdout.write(json.dumps(groups, indent=indent))
+        data = inventory.get_cached_script_data()
+        self.stdout.write(json.dumps(data, indent=indent))
 
     def get_host(self, inventory, hostname, indent=None):
         from lib.main.models import Host
@@ -0,0 +1,68 @@
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+from optparse import make_option
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    '''
+    Update the playbook index of projects, parsing candidate playbooks in
+    parallel.
+    '''
+
+    args = '<project_id project_id ...>'
+    help = 'Update the playbook index of projects (all active projects by default)'
+
+    option_list = BaseCommand.option_list + (
+        make_option('-p', '--processes', dest='processes', type='int',
+                    default=None, help='Number of processes used to parse '
+                    'playbooks (default is one per CPU)'),
+        make_option('--full', action='store_true', dest='full', default=False,
+                    help='Check all files again, not only new or changed ones'),
+        make_option('--async', action='store_true', dest='async', default=False,
+                    help='Queue a celery task to update the index instead'),
+    )
+
+    def handle(self, *args, **options):
+        from lib.main.models import Project
+        from lib.main.tasks import ScanPlaybooks
+        try:
+            project_pks = [int(arg) for arg in args] or None
+        except ValueError:
+            raise CommandError('Project IDs must be integers')
+        processes = options.get('processes', None)
+        if options.get('async', False):
+            ScanPlaybooks().delay(project_pks, processes)
+            self.stdout.write('Queued playbook scan\n')
+            return
+        projects = Project.objects.filter(active=True).order_by('pk')
+        if project_pks is not None:
+            projects = projects.filter(pk__in=project_pks)
+            if projects.count() != len(set(project_pks)):
+                raise CommandError('Project not found')
+        for project in projects:
+            if options.get('full', False):
+                project.playbook_files.all().delete()
+            start = time.time()
+            playbooks = project.update_playbook_index(processes)
+            elapsed = max(time.time() - start, 0.000001)
+            files = project.playbook_files.count()
+            checked = project.checked_files
+            self.stdout.write('%s: %d playbooks in %d files, %d checked in '
+                              '%.2f seconds (%.0f files/sec)\n' % (project.name,
+                              len(playbooks), files, checked, elapsed,
+                              checked / elapsed))
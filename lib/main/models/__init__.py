@@ -15,24 +15,33 @@
 # along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
 
 
+import functools
+import json
+import logging
 import os
+import socket
+import time
 from django.conf import settings
-from django.db import models, DatabaseError
-from django.db.models import CASCADE, SET_NULL, PROTECT
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db import connection, models, transaction, DatabaseError, IntegrityError
+from django.db.models import CASCADE, SET_NULL, PROTECT, F, Q
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
-from django.core.urlresolvers import reverse
+from lib.main.fields import CompressedJSONField, encode_json, split_documents, expand_documents
+from lib.main.playbooks import find_playbook_files, classify_playbooks
+from lib.main.url_templates import build_url
 from django.contrib.auth.models import User
 from django.utils.timezone import now
 import exceptions
 from jsonfield import JSONField
 from djcelery.models import TaskMeta
 from rest_framework.authtoken.models import Token
-import yaml
 
 # TODO: reporting model TBD
 
+logger = logging.getLogger('lib.main.models')
+
 PERM_INVENTORY_ADMIN  = 'admin'
 PERM_INVENTORY_READ   = 'read'
 PERM_INVENTORY_WRITE  = 'write'
@@ -76,6 +85,106 @@ PERMISSION_TYPE_CHOICES = [
     (PERM_INVENTORY_CHECK, _('Deploy To Inventory (Dry Run)')),
 ]
 
+ACCESS_CACHE_GENERATION_KEY = 'access_cache_generation'
+
+def get_access_cache_generation(user):
+    '''
+    Return the generation number used in shared access cache keys, read once
+    per request and kept on the user object.  Changing the generation
+    invalidates every access decision cached in the shared backend.
+    '''
+    generation = getattr(user, '_access_cache_generation', None)
+    if generation is None:
+        generation = cache.get(ACCESS_CACHE_GENERATION_KEY)
+        if generation is None:
+            # Start from the current time in case an earlier generation was
+            # evicted from the cache while entries using it were not.
+            generation = int(time.time() * 1000)
+            cache.add(ACCESS_CACHE_GENERATION_KEY, generation, 86400 * 30)
+        user._access_cache_generation = generation
+    return generation
+
+def update_access_cache_generation():
+    try:
+        cache.incr(ACCESS_CACHE_GENERATION_KEY)
+    except ValueError:
+        cache.set(ACCESS_CACHE_GENERATION_KEY, int(time.time() * 1000),
+                  86400 * 30)
+
+def get_cached_access(user, key, func):
+    '''
+    Return the result of func() for the given user and key, remembered for
+    the rest of the request and, when ACCESS_CACHE_TIMEOUT is set, in the
+    shared cache until permissions, team membership or organization admins
+    change.
+    '''
+    decisions = getattr(user, '_access_decisions', None)
+    if decisions is None:
+        decisions = user._access_decisions = {}
+    if key in decisions:
+        return decisions[key]
+    timeout = getattr(settings, 'ACCESS_CACHE_TIMEOUT', 0)
+    if timeout:
+        cache_key = 'access_%d_%d_%s' % (get_access_cache_generation(user),
+                                         user.pk, '_'.join(map(str, key)))
+        result = cache.get(cache_key)
+        if result is None:
+            result = func()
+            cache.set(cache_key, result, timeout)
+    else:
+        result = func()
+    decisions[key] = result
+    return result
+
+def cache_access(action):
+    '''
+    Decorator for can_user_read/can_user_administrate/can_user_delete
+    methods to remember their decisions per user, object and action.
+    Decisions about request data (a data argument other than None) depend on
+    that data, so they aren't remembered.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(cls, user, obj, *args, **kwargs):
+            if user.is_anonymous() or user.is_superuser or obj is None or \
+               getattr(obj, 'pk', None) is None or \
+               any(arg is not None for arg in args + tuple(kwargs.values())):
+                return func(cls, user, obj, *args, **kwargs)
+            key = (cls.__name__, obj.pk, action)
+            return get_cached_access(user, key,
+                                     lambda: func(cls, user, obj, *args, **kwargs))
+        return wrapper
+    return decorator
+
+JOB_EVENTS_GENERATION_KEY = 'job_events_generation_%d'
+
+# Set in the cache when a job is canceled, for tasks that can't be notified
+# through their cancel socket.
+JOB_CANCELED_KEY = 'job_canceled_%d'
+
+def is_cache_shared():
+    '''
+    Whether the default cache backend is shared between processes, e.g.
+    between the web server and the celery workers.
+    '''
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return backend.rsplit('.', 1)[-1] not in ('LocMemCache', 'DummyCache')
+
+def get_job_events_generation(job_pk):
+    '''
+    Return the generation number of the events of a job, changed whenever
+    events are written or the job is saved, or None if the cache doesn't know
+    it (e.g. it is not shared with the process storing the events).
+    '''
+    return cache.get(JOB_EVENTS_GENERATION_KEY % job_pk)
+
+def update_job_events_generation(job_pk):
+    key = JOB_EVENTS_GENERATION_KEY % job_pk
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), 86400)
+
 class EditHelper(object):
 
     @classmethod
@@ -108,6 +217,7 @@ class UserHelper(object):
     admin_only_edit_fields = ('last_name', 'first_name', 'username', 'is_active', 'is_superuser')
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         ''' a user can be administrated if they are themselves, or by org admins or superusers '''
         if user == obj:
@@ -118,12 +228,14 @@ class UserHelper(object):
         return matching_orgs
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         ''' a user can be read if they are on the same team or can be administrated '''
         matching_teams = user.teams.filter(users__in = [ user ]).count()
         return matching_teams or cls.can_user_administrate(user, obj, None)
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         if user.is_superuser:
             return True
@@ -156,7 +268,8 @@ class PrimordialModel(models.Model):
 
     description   = models.TextField(blank=True, default='')
     created_by    = models.ForeignKey('auth.User', on_delete=SET_NULL, null=True, related_name='%s(class)s_created', editable=False) # not blank=False on purpose for admin!
-    creation_date = models.DateField(auto_now_add=True)
+    creation_date = models.DateField(auto_now_add=True, db_index=True)
+    modified      = models.DateTimeField(auto_now=True, editable=False)
     tags          = models.ManyToManyField('Tag', related_name='%(class)s_by_tag', blank=True)
     audit_trail   = models.ManyToManyField('AuditTrail', related_name='%(class)s_by_audit_trail', blank=True)
     active        = models.BooleanField(default=True)
@@ -164,6 +277,13 @@ class PrimordialModel(models.Model):
     def __unicode__(self):
         return unicode("%s-%s"% (self.name, self.id))
 
+    def save(self, *args, **kwargs):
+        # modified is set on every save, including saves of only some fields.
+        update_fields = kwargs.get('update_fields', None)
+        if update_fields is not None and 'modified' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['modified']
+        super(PrimordialModel, self).save(*args, **kwargs)
+
     @classmethod
     def can_user_administrate(cls, user, obj, data):
         # FIXME: do we want a seperate method to override put?  This is kind of general purpose
@@ -215,7 +335,7 @@ class CommonModelNameNotUnique(PrimordialModel):
     class Meta:
         abstract = True
 
-    name          = models.CharField(max_length=512, unique=False)
+    name          = models.CharField(max_length=512, unique=False, db_index=True)
 
 class Tag(models.Model):
     '''
@@ -232,7 +352,7 @@ class Tag(models.Model):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_TagsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_TagsDetail, self.pk)
 
     @classmethod
     def can_user_add(cls, user, data):
@@ -276,13 +396,15 @@ class Organization(CommonModel):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_OrganizationsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_OrganizationsDetail, self.pk)
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         return user in obj.admins.all()
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         # FIXME: super user checks should be higher up so we don't have to repeat them
         if user.is_superuser:
@@ -293,10 +415,12 @@ class Organization(CommonModel):
         return rc
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         return cls.can_user_administrate(user,obj,None) or user in obj.users.all()
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         return cls.can_user_administrate(user, obj, None)
 
@@ -314,10 +438,87 @@ class Inventory(CommonModel):
         unique_together = (("name", "organization"),)
 
     organization = models.ForeignKey(Organization, null=False, related_name='inventories')
+    # Incremented whenever hosts, groups or their variables change; used to
+    # invalidate the cached inventory script data.
+    version      = models.PositiveIntegerField(default=0, editable=False)
+    # Number of active hosts whose last job failed.
+    hosts_with_active_failures = models.PositiveIntegerField(default=0, editable=False)
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_InventoryDetail, args=(self.pk,))
+        return build_url(lib.urls.views_InventoryDetail, self.pk)
+
+    def get_script_data(self):
+        '''
+        Return the inventory as a dictionary in the format expected from an
+        ansible inventory script called with --list, including host variables
+        under _meta.hostvars.
+        '''
+        # Load the whole inventory with a fixed number of queries instead of
+        # several queries per group.
+        # FIXME: Check if groups/hosts are active?
+        group_names, group_vars = {}, {}
+        for pk, name, data in self.groups.values_list('pk', 'name',
+                                                      'variable_data__data'):
+            group_names[pk] = name
+            if data is not None:
+                group_vars[pk] = json.loads(data)
+        group_hosts = {}
+        for group_pk, host_name in Group.hosts.through.objects.filter(
+                group__inventory=self).values_list('group_id', 'host__name'):
+            group_hosts.setdefault(group_pk, []).append(host_name)
+        group_children = {}
+        for parent_pk, child_name in Group.parents.through.objects.filter(
+                from_group__inventory=self).values_list('to_group_id',
+                                                        'from_group__name'):
+            group_children.setdefault(parent_pk, []).append(child_name)
+        hostvars = {}
+        for name, data in self.hosts.values_list('name', 'variable_data__data'):
+            hostvars[name] = json.loads(data) if data is not None else {}
+
+        groups = {}
+        for pk, name in group_names.items():
+            group_info = {
+                'hosts': group_hosts.get(pk, []),
+                'children': group_children.get(pk, []),
+                'vars': group_vars.get(pk, {}),
+            }
+            group_info = dict(filter(lambda x: bool(x[1]), group_info.items()))
+            if group_info.keys() in ([], ['hosts']):
+                groups[name] = group_info.get('hosts', [])
+            else:
+                groups[name] = group_info
+        # Include host variables so that ansible (1.3 and later) doesn't need
+        # to run the script with --host for every host.  The empty hosts list
+        # keeps older versions from treating _meta as a host.
+        groups['_meta'] = {'hosts': [], 'hostvars': hostvars}
+        return groups
+
+    def update_hosts_with_active_failures(self, hosts_changed=False):
+        count = self.hosts.filter(active=True, has_active_failures=True).count()
+        # The count is part of the inventory, so it's modified when it changes
+        # (conditional GETs compare modification times), or when the last job
+        # results of hosts have changed (lists of hosts include them).
+        qs = Inventory.objects.filter(pk=self.pk)
+        if not hosts_changed:
+            qs = qs.exclude(hosts_with_active_failures=count)
+        qs.update(hosts_with_active_failures=count, modified=now())
+        self.hosts_with_active_failures = count
+
+    def get_cached_script_data(self):
+        '''
+        Return the same data as get_script_data, from the cache if the
+        inventory hasn't changed since it was last built.
+        '''
+        version = Inventory.objects.filter(pk=self.pk).values_list('version',
+                                                                   flat=True)[0]
+        cache_key = 'inventory_script_data_%d_%d' % (self.pk, version)
+        data = cache.get(cache_key)
+        if data is None:
+            data = self.get_script_data()
+            cache.set(cache_key, data,
+                      getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 3600))
+        return data
 
     @classmethod
     def _has_permission_types(cls, user, obj, allowed):
@@ -360,6 +561,25 @@ class Inventory(CommonModel):
         result = (by_org_admin + by_team_permission + by_user_permission)
         return result > 0
 
+    @classmethod
+    def get_readable_pks(cls, user):
+        '''
+        Return the set of IDs of inventories the user can read, as an
+        organization admin or through user or team permissions.  The result
+        is cached like other access decisions (see get_cached_access).
+        '''
+        def get_pks():
+            pks = set(cls.objects.filter(
+                organization__admins__in = [ user ],
+            ).values_list('pk', flat=True))
+            pks.update(Permission.objects.filter(
+                Q(user = user) | Q(team__users__in = [ user ]),
+                permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
+                inventory__isnull = False,
+            ).values_list('inventory_id', flat=True))
+            return pks
+        return get_cached_access(user, (cls.__name__, 'readable'), get_pks)
+
     @classmethod
     def can_user_add(cls, user, data):
         if not 'organization' in data:
@@ -373,6 +593,7 @@ class Inventory(CommonModel):
         return False
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         return cls._has_permission_types(user, obj, PERMISSION_TYPES_ALLOWING_INVENTORY_ADMIN)
 
@@ -388,10 +609,12 @@ class Inventory(CommonModel):
         return cls._has_permission_types(user, obj, PERMISSION_TYPES_ALLOWING_INVENTORY_WRITE)
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         return cls._has_permission_types(user, obj, PERMISSION_TYPES_ALLOWING_INVENTORY_READ)
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         return cls._has_permission_types(user, obj, PERMISSION_TYPES_ALLOWING_INVENTORY_ADMIN)
 
@@ -406,11 +629,17 @@ class Host(CommonModelNameNotUnique):
 
     variable_data  = models.OneToOneField('VariableData', null=True, default=None, blank=True, on_delete=SET_NULL, related_name='host')
     inventory      = models.ForeignKey('Inventory', null=False, related_name='hosts')
+    # The results of the last job run on the host, kept up to date when job
+    # host summaries are saved (see JobEvent.update_host_summary_from_stats).
+    last_job       = models.ForeignKey('Job', null=True, default=None, blank=True, editable=False, on_delete=SET_NULL, related_name='hosts_as_last_job+')
+    last_job_host_summary = models.ForeignKey('JobHostSummary', null=True, default=None, blank=True, editable=False, on_delete=SET_NULL, related_name='hosts_as_last_job_summary+')
+    has_active_failures = models.BooleanField(default=False, editable=False, db_index=True)
 
     def __unicode__(self):
         return self.name
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         return Inventory.can_user_read(user, obj.inventory)
 
@@ -424,11 +653,11 @@ class Host(CommonModelNameNotUnique):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_HostsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_HostsDetail, self.pk)
 
     # Use .job_host_summaries.all() to get jobs affecting this host.
     # Use .job_events.all() to get events affecting this host.
-    # Use .job_host_summaries.order_by('-pk')[0] to get the last result.
+    # Use .last_job_host_summary to get the last result.
 
 class Group(CommonModelNameNotUnique):
     '''
@@ -456,17 +685,101 @@ class Group(CommonModelNameNotUnique):
 
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         # here this controls whether the user can attach subgroups
         return Inventory._has_permission_types(user, obj.inventory, PERMISSION_TYPES_ALLOWING_INVENTORY_WRITE)
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         return Inventory.can_user_read(user, obj.inventory)
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_GroupsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_GroupsDetail, self.pk)
+
+    def all_children(self):
+        '''
+        Return all groups below this group, including children of children.
+        '''
+        return Group.objects.filter(
+            ancestor_closures__ancestor=self,
+        ).exclude(pk=self.pk).distinct()
+
+    def all_hosts(self):
+        '''
+        Return all hosts in this group or any group below it.
+        '''
+        return Host.objects.filter(
+            groups__ancestor_closures__ancestor=self,
+        ).distinct()
+
+class GroupClosure(models.Model):
+    '''
+    Every ancestor/descendant pair in the group hierarchy (including each
+    group paired with itself), kept up to date by signal handlers whenever
+    group parents change, so that descendants can be found with one join.
+    '''
+
+    class Meta:
+        app_label = 'main'
+        unique_together = (('ancestor', 'descendant'),)
+
+    ancestor   = models.ForeignKey('Group', related_name='descendant_closures')
+    descendant = models.ForeignKey('Group', related_name='ancestor_closures')
+
+    def __unicode__(self):
+        return u'%s > %s' % (self.ancestor_id, self.descendant_id)
+
+    @classmethod
+    def add_parent(cls, group_pk, parent_pk):
+        '''
+        Add the pairs needed when parent_pk becomes a parent of group_pk.
+        '''
+        ancestors = set(cls.objects.filter(descendant__pk=parent_pk).values_list('ancestor_id', flat=True))
+        ancestors.add(parent_pk)
+        descendants = set(cls.objects.filter(ancestor__pk=group_pk).values_list('descendant_id', flat=True))
+        descendants.add(group_pk)
+        existing = set(cls.objects.filter(
+            descendant__ancestor_closures__ancestor__pk=group_pk,
+        ).values_list('ancestor_id', 'descendant_id'))
+        cls.objects.bulk_create([
+            cls(ancestor_id=a, descendant_id=d) for a in ancestors
+            for d in descendants if (a, d) not in existing
+        ])
+
+    @classmethod
+    def rebuild(cls, inventory_pk):
+        '''
+        Recalculate all pairs for groups in the given inventory.
+        '''
+        children = {}
+        for group_pk, parent_pk in Group.parents.through.objects.filter(
+                from_group__inventory__pk=inventory_pk).values_list('from_group_id',
+                                                                    'to_group_id'):
+            children.setdefault(parent_pk, set()).add(group_pk)
+        wanted = set()
+        for group_pk in Group.objects.filter(inventory__pk=inventory_pk).values_list('pk', flat=True):
+            # Walk down from each group, keeping track of groups already seen
+            # in case the hierarchy contains a cycle.
+            pending, seen = [group_pk], set([group_pk])
+            while pending:
+                for child_pk in children.get(pending.pop(), ()):
+                    if child_pk not in seen:
+                        seen.add(child_pk)
+                        pending.append(child_pk)
+            wanted.update((group_pk, d) for d in seen)
+        obsolete = []
+        for pk, a, d in cls.objects.filter(ancestor__inventory__pk=inventory_pk).values_list('pk', 'ancestor_id', 'descendant_id'):
+            if (a, d) in wanted:
+                wanted.remove((a, d))
+            else:
+                obsolete.append(pk)
+        # Delete in chunks to stay below database limits on query parameters.
+        for n in xrange(0, len(obsolete), 500):
+            cls.objects.filter(pk__in=obsolete[n:n + 500]).delete()
+        cls.objects.bulk_create([cls(ancestor_id=a, descendant_id=d) for a, d in wanted])
 
 # FIXME: audit nullables
 # FIXME: audit cascades
@@ -489,9 +802,10 @@ class VariableData(CommonModelNameNotUnique):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_VariableDetail, args=(self.pk,))
+        return build_url(lib.urls.views_VariableDetail, self.pk)
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         ''' a user can be read if they are on the same team or can be administrated '''
         if obj.host is not None:
@@ -568,6 +882,7 @@ class Credential(CommonModelNameNotUnique):
         return self.sudo_password == 'ASK'
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         if user.is_superuser:
             return True
@@ -583,6 +898,7 @@ class Credential(CommonModelNameNotUnique):
         return False
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         if obj.user is None and obj.team is None:
             # unassociated credentials may be marked deleted by anyone
@@ -590,6 +906,7 @@ class Credential(CommonModelNameNotUnique):
         return cls.can_user_administrate(user,obj,None)
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         ''' a user can be read if they are on the same team or can be administrated '''
         return cls.can_user_administrate(user, obj, None)
@@ -607,7 +924,7 @@ class Credential(CommonModelNameNotUnique):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_CredentialsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_CredentialsDetail, self.pk)
 
 class Team(CommonModel):
     '''
@@ -623,9 +940,10 @@ class Team(CommonModel):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_TeamsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_TeamsDetail, self.pk)
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         # FIXME -- audit when this is called explicitly, if any
         if user.is_superuser:
@@ -635,6 +953,7 @@ class Team(CommonModel):
         return False
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         if cls.can_user_administrate(user, obj, None):
             return True
@@ -653,6 +972,7 @@ class Team(CommonModel):
         return False
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         return cls.can_user_administrate(user, obj, None)
 
@@ -679,9 +999,10 @@ class Project(CommonModel):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_ProjectsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_ProjectsDetail, self.pk)
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         if user.is_superuser:
             return True
@@ -694,6 +1015,7 @@ class Project(CommonModel):
         return False
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         if cls.can_user_administrate(user, obj, None):
             return True
@@ -702,39 +1024,89 @@ class Project(CommonModel):
         return False
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         return cls.can_user_administrate(user, obj, None)
 
     @property
     def available_playbooks(self):
-        playbooks = []
+        return self.update_playbook_index()
+
+    def update_playbook_index(self, processes=1):
+        '''
+        Bring the index of .yml files in local_path up to date, checking only
+        files that are new or changed since the last update, and return the
+        relative paths of the playbooks found.  Files are checked with the
+        given number of processes (None for one per CPU); the number of files
+        checked is kept in checked_files.
+        '''
+        found = []
         if self.local_path and os.path.exists(self.local_path):
-            for dirpath, dirnames, filenames in os.walk(self.local_path):
-                for filename in filenames:
-                    if os.path.splitext(filename)[-1] != '.yml':
-                        continue
-                    playbook = os.path.join(dirpath, filename)
-                    # Filter any invalid YAML files.
-                    try:
-                        data = yaml.safe_load(file(playbook).read())
-                    except (IOError, yaml.YAMLError):
-                        continue
-                    # Filter files that do not have either hosts or top-level
-                    # includes.
-                    try:
-                        if 'hosts' not in data[0] and 'include' not in data[0]:
-                            continue
-                    except (TypeError, IndexError, KeyError):
-                        continue
-                    playbook = os.path.relpath(playbook, self.local_path)
-                    # Filter files in a roles subdirectory.
-                    if 'roles' in playbook.split(os.sep):
-                        continue
-                    # Filter files in a tasks subdirectory.
-                    if 'tasks' in playbook.split(os.sep):
-                        continue
-                    playbooks.append(playbook)
-        return playbooks
+            found = find_playbook_files(self.local_path)
+        if not self.pk:
+            paths = [path for path, mtime, size in found]
+            self.checked_files = len(paths)
+            results = classify_playbooks([os.path.join(self.local_path, path)
+                                          for path in paths], processes)
+            return sorted([path for path, result in zip(paths, results) if result])
+        known = dict((entry.path, entry) for entry in self.playbook_files.all())
+        new, changed, pending, playbooks = [], [], [], []
+        for path, mtime, size in found:
+            entry = known.pop(path, None)
+            if entry is None:
+                entry = ProjectPlaybook(project=self, path=path)
+                new.append(entry)
+            elif entry.mtime != mtime or entry.size != size:
+                changed.append(entry)
+            else:
+                if entry.is_playbook:
+                    playbooks.append(path)
+                continue
+            entry.mtime, entry.size = mtime, size
+            pending.append(entry)
+        self.checked_files = len(pending)
+        results = classify_playbooks([os.path.join(self.local_path, entry.path)
+                                      for entry in pending], processes)
+        for entry, result in zip(pending, results):
+            entry.is_playbook = result
+            if result:
+                playbooks.append(entry.path)
+        obsolete = [entry.pk for entry in known.values()]
+        for n in xrange(0, len(obsolete), 500):
+            ProjectPlaybook.objects.filter(pk__in=obsolete[n:n + 500]).delete()
+        sid = transaction.savepoint()
+        try:
+            ProjectPlaybook.objects.bulk_create(new)
+        except IntegrityError:
+            # A concurrent update indexed some of the same files meanwhile.
+            transaction.savepoint_rollback(sid)
+            for entry in new:
+                ProjectPlaybook.objects.filter(project=self, path=entry.path).delete()
+                entry.save()
+        else:
+            transaction.savepoint_commit(sid)
+        for entry in changed:
+            entry.save()
+        return sorted(playbooks)
+
+class ProjectPlaybook(models.Model):
+    '''
+    A .yml file in a project directory, with the size and modification time
+    it had when it was last checked for being a playbook.
+    '''
+
+    class Meta:
+        app_label = 'main'
+        unique_together = (('project', 'path'),)
+
+    project     = models.ForeignKey('Project', related_name='playbook_files')
+    path        = models.CharField(max_length=1024)
+    mtime       = models.FloatField()
+    size        = models.BigIntegerField()
+    is_playbook = models.BooleanField(default=False)
+
+    def __unicode__(self):
+        return unicode(self.path)
 
 class Permission(CommonModelNameNotUnique):
     '''
@@ -778,9 +1150,10 @@ class Permission(CommonModelNameNotUnique):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_PermissionsDetail, args=(self.pk,))
+        return build_url(lib.urls.views_PermissionsDetail, self.pk)
 
     @classmethod
+    @cache_access('administrate')
     def can_user_administrate(cls, user, obj, data):
         if user.is_superuser:
             return True
@@ -794,6 +1167,7 @@ class Permission(CommonModelNameNotUnique):
         return False
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         # a permission can be seen by the assigned user or team
         # or anyone who can administrate that permission
@@ -804,6 +1178,7 @@ class Permission(CommonModelNameNotUnique):
         return cls.can_user_administrate(user, obj, None)
 
     @classmethod
+    @cache_access('delete')
     def can_user_delete(cls, user, obj):
         return cls.can_user_administrate(user, obj, None)
 
@@ -893,9 +1268,10 @@ class JobTemplate(CommonModel):
 
     def get_absolute_url(self):
         import lib.urls
-        return reverse(lib.urls.views_JobTemplateDetail, args=(self.pk,))
+        return build_url(lib.urls.views_JobTemplateDetail, self.pk)
 
     @classmethod
+    @cache_access('read')
     def can_user_read(cls, user, obj):
         # you can only see the job templates that you have permission to launch.
         data = dict(
@@ -1049,8 +1425,15 @@ class Job(CommonModel):
         choices=STATUS_CHOICES,
         default='new',
         editable=False,
+        db_index=True,
+    )
+    result_stdout_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        db_column='result_stdout',
     )
-    result_stdout = models.TextField(
+    result_stdout_file = models.TextField(
         blank=True,
         default='',
         editable=False,
@@ -1071,6 +1454,40 @@ class Job(CommonModel):
         default='',
         editable=False,
     )
+    inventory_render_time = models.FloatField(
+        blank=True,
+        default=0.0,
+        editable=False,
+        help_text=_('Seconds spent writing the inventory file for the job.'),
+    )
+    host_summary_time = models.FloatField(
+        blank=True,
+        default=0.0,
+        editable=False,
+        help_text=_('Seconds spent saving per-host statistics of the job.'),
+    )
+    # Number of hosts with each result, saved with the host summaries so that
+    # job lists don't need to count them.
+    hosts_ok = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    hosts_failed = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    hosts_changed = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    hosts_dark = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+    hosts_skipped = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
     hosts = models.ManyToManyField(
         'Host',
         related_name='jobs',
@@ -1079,6 +1496,47 @@ class Job(CommonModel):
         through='JobHostSummary',
     )
 
+    def get_absolute_url(self):
+        import lib.urls
+        return build_url(lib.urls.views_JobsDetail, self.pk)
+
+    @classmethod
+    @cache_access('read')
+    def can_user_read(cls, user, obj):
+        '''
+        a user can see a job if they are a superuser, created the job, or are an admin of
+        an organization or a member of a team containing the job's project.
+        '''
+        if user.is_superuser:
+            return True
+        if obj.created_by == user:
+            return True
+        if obj.project is None:
+            return False
+        if obj.project.organizations.filter(admins__in = [ user ]).count():
+            return True
+        if obj.project.teams.filter(users__in = [ user ]).count():
+            return True
+        return False
+
+    @classmethod
+    def get_readable_project_pks(cls, user):
+        '''
+        Return the set of IDs of projects whose jobs the user can read, as an
+        admin of one of their organizations or a member of one of their
+        teams.  The result is cached like other access decisions (see
+        get_cached_access).
+        '''
+        def get_pks():
+            pks = set(Project.objects.filter(
+                organizations__admins__in = [ user ],
+            ).values_list('pk', flat=True))
+            pks.update(Project.objects.filter(
+                teams__users__in = [ user ],
+            ).values_list('pk', flat=True))
+            return pks
+        return get_cached_access(user, (cls.__name__, 'readable_projects'), get_pks)
+
     @property
     def celery_task(self):
         try:
@@ -1087,6 +1545,43 @@ class Job(CommonModel):
         except TaskMeta.DoesNotExist:
             pass
 
+    @property
+    def result_stdout_size(self):
+        '''Return the size of the job output in bytes.'''
+        if self.result_stdout_file:
+            try:
+                return os.path.getsize(self.result_stdout_file)
+            except OSError:
+                return 0
+        return len(self.result_stdout_text.encode('utf-8'))
+
+    def get_result_stdout_range(self, start=0, end=None):
+        '''
+        Return the bytes of job output from start up to (but not including)
+        end.  A negative start counts back from the end of the output.
+        '''
+        if start < 0:
+            start = max(0, self.result_stdout_size + start)
+        if end is not None and end <= start:
+            return ''
+        if self.result_stdout_file:
+            try:
+                f = open(self.result_stdout_file, 'rb')
+            except IOError:
+                return ''
+            try:
+                f.seek(start)
+                if end is None:
+                    return f.read()
+                return f.read(end - start)
+            finally:
+                f.close()
+        return self.result_stdout_text.encode('utf-8')[start:end]
+
+    @property
+    def result_stdout(self):
+        return self.get_result_stdout_range().decode('utf-8', 'replace')
+
     def get_passwords_needed_to_start(self):
         '''Return list of password field names needed to start the job.'''
         needed = []
@@ -1112,13 +1607,74 @@ class Job(CommonModel):
         self.save(update_fields=['celery_task_id'])
         return True
 
+    @property
+    def cancel_socket_path(self):
+        '''
+        Path of the socket a running job listens on for cancel requests.
+        '''
+        return os.path.join(settings.JOBOUTPUT_ROOT, '%d.cancel' % self.pk)
+
     def cancel(self):
         if self.status in ('pending', 'running'):
             if not self.cancel_flag:
                 self.cancel_flag = True
                 self.save(update_fields=['cancel_flag'])
+            cache.set(JOB_CANCELED_KEY % self.pk, True, 86400)
+            # Wake up the task running the job so it can stop right away.  If
+            # the job hasn't started yet, the task checks cancel_flag before
+            # it runs ansible-playbook.
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                sock.sendto('cancel', self.cancel_socket_path)
+            except socket.error, e:
+                # The job may be running on another host, or not have started
+                # yet; it also checks the cache every JOB_CANCEL_POLL_INTERVAL
+                # seconds (and the database every JOB_CANCEL_DB_POLL_INTERVAL).
+                logger.info('Unable to notify job %d of cancellation through '
+                            '%s: %s', self.pk, self.cancel_socket_path, e)
+            finally:
+                sock.close()
         return self.cancel_flag
 
+    def get_events_since(self, since_id=0, timeout=0, limit=100,
+                         before_wait=None):
+        '''
+        Return up to limit events of this job with an id greater than
+        since_id.  If there are none yet and the job hasn't finished, wait up
+        to timeout seconds for more.  While waiting only the generation
+        number in the cache is checked, every JOB_EVENT_TAIL_POLL_INTERVAL
+        milliseconds, and the database is queried again when it changes.
+        Without a shared cache the generation would never change, so there is
+        no waiting at all.
+
+        before_wait is called (if given) each time before waiting, e.g. to end
+        the caller's transaction so that it isn't held open and later queries
+        see new events.
+        '''
+        poll_interval = getattr(settings, 'JOB_EVENT_TAIL_POLL_INTERVAL', 250) / 1000.0
+        if not is_cache_shared():
+            timeout = 0
+        deadline = time.time() + timeout
+        first = True
+        while True:
+            # Read the generation first, so events written after the query
+            # below always change it.
+            generation = get_job_events_generation(self.pk)
+            events = list(self.job_events.filter(pk__gt=since_id).order_by('pk')[:limit])
+            if events or time.time() >= deadline:
+                return events
+            if not first:
+                self.status = Job.objects.filter(pk=self.pk).values_list('status', flat=True)[0]
+            first = False
+            if self.status not in ('new', 'pending', 'running'):
+                return events
+            if before_wait is not None:
+                before_wait()
+            while time.time() < deadline:
+                time.sleep(max(0, min(poll_interval, deadline - time.time())))
+                if get_job_events_generation(self.pk) != generation:
+                    break
+
     @property
     def successful_hosts(self):
         return Host.objects.filter(job_host_summaries__job__pk=self.pk,
@@ -1185,6 +1741,77 @@ class JobHostSummary(models.Model):
             (self.host.name, self.changed, self.dark, self.failures, self.ok,
              self.processed, self.skipped)
 
+class JobEventDocument(models.Model):
+    '''
+    A large sub-document of job event data (e.g. facts or a package list),
+    stored once for all events that include it and referred to by checksum.
+    '''
+
+    class Meta:
+        app_label = 'main'
+
+    checksum = models.CharField(
+        max_length=40,
+        unique=True,
+    )
+    data = CompressedJSONField(
+        blank=True,
+        default='',
+    )
+
+    def __unicode__(self):
+        return self.checksum
+
+    @classmethod
+    def store(cls, documents):
+        '''
+        Store the given documents (a dict by checksum) which aren't stored
+        yet, with one query per 500 documents to find them and one to insert.
+        '''
+        checksums = list(documents)
+        existing = set()
+        for offset in xrange(0, len(checksums), 500):
+            existing.update(cls.objects.filter(
+                checksum__in=checksums[offset:offset + 500],
+            ).values_list('checksum', flat=True))
+        new = [cls(checksum=checksum, data=documents[checksum])
+               for checksum in checksums if checksum not in existing]
+        if not new:
+            return
+        sid = transaction.savepoint()
+        try:
+            cls.objects.bulk_create(new)
+        except IntegrityError:
+            # Another job stored some of the same documents meanwhile.
+            transaction.savepoint_rollback(sid)
+            for document in new:
+                cls.objects.get_or_create(checksum=document.checksum,
+                                          defaults={'data': document.data})
+        else:
+            transaction.savepoint_commit(sid)
+
+    @classmethod
+    def get_documents(cls, checksums):
+        '''
+        Return a dict of the data of the documents with the given checksums,
+        from the cache when possible.  Documents never change, so they are
+        kept in the cache as long as it allows.
+        '''
+        keys = dict(('job_event_document_%s' % c, c) for c in checksums)
+        found = dict((keys[k], v) for k, v in cache.get_many(keys.keys()).items())
+        missing = [c for c in checksums if c not in found]
+        loaded = {}
+        for offset in xrange(0, len(missing), 500):
+            for checksum, data in cls.objects.filter(
+                checksum__in=missing[offset:offset + 500],
+            ).values_list('checksum', 'data'):
+                loaded[checksum] = cls._meta.get_field('data').to_python(data)
+        if loaded:
+            cache.set_many(dict(('job_event_document_%s' % k, v)
+                                for k, v in loaded.items()), 86400)
+        found.update(loaded)
+        return found
+
 class JobEvent(models.Model):
     '''
     An event/message logged from the callback when running a job.
@@ -1226,7 +1853,7 @@ class JobEvent(models.Model):
         max_length=100,
         choices=EVENT_TYPES,
     )
-    event_data = JSONField(
+    event_data = CompressedJSONField(
         blank=True,
         default='',
     )
@@ -1248,35 +1875,147 @@ class JobEvent(models.Model):
                 self.host = self.job.inventory.hosts.get(name=self.event_data['host'])
         except (Host.DoesNotExist, AttributeError):
             pass
+        JobEvent.prepare_event_data([self])
         super(JobEvent, self).save(*args, **kwargs)
+        update_job_events_generation(self.job_id)
         self.update_host_summary_from_stats()
 
+    @classmethod
+    def prepare_event_data(cls, job_events):
+        '''
+        Set the text stored for the data of each event before it is saved:
+        compressed, with sub-documents of at least JOB_EVENT_DOCUMENT_SIZE
+        bytes (such as facts) stored once as JobEventDocuments, or plain JSON
+        when JOB_EVENT_DATA_COMPRESSION is disabled.  Data loaded from the
+        database and not used since is stored again as it was.
+        '''
+        field = cls._meta.get_field('event_data')
+        compress = getattr(settings, 'JOB_EVENT_DATA_COMPRESSION', True)
+        min_size = getattr(settings, 'JOB_EVENT_DOCUMENT_SIZE', 2048)
+        documents = {}
+        for job_event in job_events:
+            if field.attname not in job_event.__dict__:
+                continue
+            if compress:
+                value, found = split_documents(job_event.event_data, min_size)
+                documents.update(found)
+                field.set_encoded(job_event, encode_json(value, field.compress_size))
+            else:
+                field.set_encoded(job_event, json.dumps(job_event.event_data))
+        JobEventDocument.store(documents)
+
+    def expand_event_data(self, value):
+        return expand_documents(value, JobEventDocument.get_documents)
+
     def update_host_summary_from_stats(self):
+        '''
+        Save the per-host statistics of a playbook_on_stats event with a fixed
+        number of queries (per chunk of 500 hosts): hosts and existing
+        summaries are each looked up at once, new summaries are inserted with
+        one query, and changed ones are updated with one query per distinct
+        set of values.  The host counts of the job are updated too.
+        '''
         if self.event != 'playbook_on_stats':
             return
+        start = time.time()
+        stats = ('changed', 'dark', 'failures', 'ok', 'processed', 'skipped')
         hostnames = set()
         try:
             for v in self.event_data.values():
                 hostnames.update(v.keys())
         except AttributeError: # In case event_data or v isn't a dict.
             pass
-        for hostname in hostnames:
-            try:
-                host = self.job.inventory.hosts.get(name=hostname)
-            except Host.DoesNotExist:
-                continue
-            host_summary = self.job.job_host_summaries.get_or_create(host=host)[0]
-            host_summary_changed = False
-            for stat in ('changed', 'dark', 'failures', 'ok', 'processed', 'skipped'):
+        hostnames = sorted(hostnames)
+        host_pks = {}
+        for n in xrange(0, len(hostnames), 500):
+            host_pks.update(self.job.inventory.hosts.filter(
+                name__in=hostnames[n:n + 500]).values_list('name', 'pk'))
+        wanted = {}
+        for hostname, host_pk in host_pks.items():
+            values = {}
+            for stat in stats:
                 try:
-                    value = self.event_data.get(stat, {}).get(hostname, 0)
-                    if getattr(host_summary, stat) != value:
-                        setattr(host_summary, stat, value)
-                        host_summary_changed = True
+                    values[stat] = self.event_data.get(stat, {}).get(hostname, 0)
                 except AttributeError: # in case event_data[stat] isn't a dict.
-                    pass
-            if host_summary_changed:
-                host_summary.save()
+                    pass    # keep the existing value.
+            wanted[host_pk] = values
+        with transaction.commit_on_success():
+            existing = {}
+            host_pk_list = sorted(wanted)
+            for n in xrange(0, len(host_pk_list), 500):
+                for row in self.job.job_host_summaries.filter(
+                        host__pk__in=host_pk_list[n:n + 500]).values('pk', 'host_id', *stats):
+                    existing[row.pop('host_id')] = row
+            JobHostSummary.objects.bulk_create([
+                JobHostSummary(job_id=self.job_id, host_id=host_pk, **values)
+                for host_pk, values in sorted(wanted.items())
+                if host_pk not in existing
+            ])
+            # Most hosts end up with the same values, so changed summaries are
+            # updated together for each distinct set of values.  Stats that
+            # couldn't be read keep their existing values.
+            updates = {}
+            results = {}
+            for host_pk, values in wanted.items():
+                row = existing.get(host_pk, None)
+                results[host_pk] = dict((stat, row[stat] if row else 0) for stat in stats)
+                results[host_pk].update(values)
+                if row and any(row[stat] != value for stat, value in values.items()):
+                    key = tuple(sorted(values.items()))
+                    updates.setdefault(key, []).append(row['pk'])
+            for key, pks in updates.items():
+                for n in xrange(0, len(pks), 500):
+                    JobHostSummary.objects.filter(pk__in=pks[n:n + 500]).update(
+                        **dict(key))
+            self.update_last_job_of_hosts(results)
+            # Count hosts with each result over all summaries of the job.
+            counts = dict((stat, 0) for stat in stats)
+            for row in self.job.job_host_summaries.values_list(*stats):
+                for stat, value in zip(stats, row):
+                    if value > 0:
+                        counts[stat] += 1
+            Job.objects.filter(pk=self.job_id).update(
+                hosts_ok=counts['ok'],
+                hosts_failed=counts['failures'],
+                hosts_changed=counts['changed'],
+                hosts_dark=counts['dark'],
+                hosts_skipped=counts['skipped'],
+                host_summary_time=time.time() - start,
+            )
+
+    def update_last_job_of_hosts(self, results):
+        '''
+        Point hosts at this job and their summaries of it (unless they have
+        already been run in a later job), with one UPDATE per chunk of 500
+        failed or successful hosts; results maps host IDs to their stats.
+        Each host has its own summary, so the summary is looked up in a
+        subquery rather than grouping hosts by value with the ORM.
+        '''
+        qn = connection.ops.quote_name
+        host_table = qn(Host._meta.db_table)
+        summary_table = qn(JobHostSummary._meta.db_table)
+        modified = Host._meta.get_field('modified').get_db_prep_value(now(), connection)
+        failed = lambda values: values['failures'] > 0 or values['dark'] > 0
+        cursor = connection.cursor()
+        for has_failures in (True, False):
+            pks = sorted(pk for pk, values in results.items()
+                         if failed(values) == has_failures)
+            for n in xrange(0, len(pks), 500):
+                chunk = pks[n:n + 500]
+                cursor.execute(
+                    'UPDATE %(host)s SET last_job_id = %%s, '
+                    'has_active_failures = %%s, modified = %%s, '
+                    'last_job_host_summary_id = (SELECT %(summary)s.id FROM '
+                    '%(summary)s WHERE %(summary)s.job_id = %%s AND '
+                    '%(summary)s.host_id = %(host)s.id) WHERE (last_job_id IS '
+                    'NULL OR last_job_id <= %%s) AND id IN (%(pks)s)' % {
+                        'host': host_table, 'summary': summary_table,
+                        'pks': ', '.join(['%s'] * len(chunk)),
+                    }, [self.job_id, has_failures, modified, self.job_id,
+                        self.job_id] + chunk)
+        transaction.commit_unless_managed()
+        if self.job.inventory_id is not None:
+            self.job.inventory.update_hosts_with_active_failures(hosts_changed=True)
 
 # TODO: reporting (MPD)
 
@@ -1289,3 +2028,109 @@ def create_auth_token_for_user(sender, **kwargs):
         except DatabaseError:
             pass    # Only fails when creating a new superuser from syncdb on a
                     # new database (before migrate has been called).
+
+def update_inventory_version(*args, **kwargs):
+    Inventory.objects.filter(*args, **kwargs).update(version=F('version') + 1)
+
+@receiver(post_save, sender=Host)
+@receiver(post_delete, sender=Host)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def update_inventory_version_for_host_or_group(sender, **kwargs):
+    update_inventory_version(pk=kwargs['instance'].inventory_id)
+
+@receiver(post_save, sender=Host)
+@receiver(post_delete, sender=Host)
+def update_hosts_with_active_failures_for_host(sender, **kwargs):
+    # Hosts with failures may have been deactivated or removed.
+    instance = kwargs['instance']
+    if instance.has_active_failures:
+        Inventory(pk=instance.inventory_id).update_hosts_with_active_failures()
+
+@receiver(post_save, sender=Job)
+def update_job_events_generation_for_job(sender, **kwargs):
+    # Clients waiting for events stop waiting once the job has finished.
+    update_job_events_generation(kwargs['instance'].pk)
+
+@receiver(post_save, sender=VariableData)
+@receiver(pre_delete, sender=VariableData)
+def update_inventory_version_for_variable_data(sender, **kwargs):
+    instance = kwargs['instance']
+    update_inventory_version(Q(hosts__variable_data=instance) |
+                             Q(groups__variable_data=instance))
+
+@receiver(m2m_changed, sender=Group.hosts.through)
+@receiver(m2m_changed, sender=Group.parents.through)
+def update_inventory_version_for_group_relations(sender, **kwargs):
+    if kwargs['action'] in ('post_add', 'post_remove', 'post_clear'):
+        update_inventory_version(pk=kwargs['instance'].inventory_id)
+
+@receiver(post_save, sender=Group)
+def update_group_closure_for_group(sender, **kwargs):
+    if kwargs['created'] and not kwargs.get('raw', False):
+        instance = kwargs['instance']
+        GroupClosure.objects.create(ancestor=instance, descendant=instance)
+
+@receiver(post_delete, sender=Group)
+def update_group_closure_for_deleted_group(sender, **kwargs):
+    # Groups may have been connected through the deleted group.
+    GroupClosure.rebuild(kwargs['instance'].inventory_id)
+
+@receiver(m2m_changed, sender=Group.parents.through)
+def update_group_closure_for_parents(sender, **kwargs):
+    instance, action = kwargs['instance'], kwargs['action']
+    if action == 'post_add':
+        for pk in kwargs['pk_set']:
+            if kwargs['reverse']:
+                GroupClosure.add_parent(pk, instance.pk)
+            else:
+                GroupClosure.add_parent(instance.pk, pk)
+    elif action in ('post_remove', 'post_clear'):
+        GroupClosure.rebuild(instance.inventory_id)
+
+def update_access_cache_for_change(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        update_access_cache_generation()
+
+# Access decisions depend on these models and relationships; when any of
+# them change, cached decisions are invalidated.
+for model in (Organization, Team, Permission, Credential, Project, Inventory,
+              JobTemplate):
+    post_save.connect(update_access_cache_for_change, sender=model)
+    post_delete.connect(update_access_cache_for_change, sender=model)
+for through in (Organization.users.through, Organization.admins.through,
+                Organization.projects.through, Team.users.through,
+                Team.projects.through):
+    m2m_changed.connect(update_access_cache_for_change, sender=through)
+
+# Decisions about hosts, groups and jobs follow their inventory, job template,
+# project or creator, so they are invalidated when those are changed.
+ACCESS_FOREIGN_KEYS = {
+    Host: ('inventory_id',),
+    Group: ('inventory_id',),
+    Job: ('job_template_id', 'project_id', 'created_by_id'),
+}
+
+def check_access_foreign_keys(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Compare against the stored row before saving; the generation itself is
+    # bumped in post_save, once the new values are written.
+    attnames = ACCESS_FOREIGN_KEYS[sender]
+    if update_fields is not None:
+        attnames = [attname for attname in attnames
+                    if attname in update_fields or attname[:-3] in update_fields]
+    instance._access_foreign_keys_changed = False
+    if raw or not instance.pk or not attnames:
+        return
+    old_values = sender.objects.filter(pk=instance.pk).values_list(*attnames)
+    new_values = tuple(getattr(instance, attname) for attname in attnames)
+    instance._access_foreign_keys_changed = \
+        any(values != new_values for values in old_values)
+
+def update_access_cache_for_foreign_keys(sender, instance, **kwargs):
+    if getattr(instance, '_access_foreign_keys_changed', False):
+        update_access_cache_generation()
+    instance._access_foreign_keys_changed = False
+
+for model in ACCESS_FOREIGN_KEYS:
+    pre_save.connect(check_access_foreign_keys, sender=model)
+    post_save.connect(update_access_cache_for_foreign_keys, sender=model)
@@ -0,0 +1,127 @@
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Cursor (keyset) pagination for list views.
+
+Offset pagination makes the database walk past every skipped row, so deep
+pages of large collections get slower the further a client goes.  With a
+cursor, each page is fetched with a WHERE clause on the (order field, pk) of
+the last object of the previous page, which costs the same for every page.
+'''
+
+import base64
+import json
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
+from rest_framework.templatetags.rest_framework import replace_query_param
+
+__all__ = ['CursorPaginator']
+
+class CursorPaginator(object):
+    '''
+    Split a queryset into pages ordered by a single non-null field of the
+    model (default is pk), using the pk to break ties.  Cursors are opaque
+    tokens to clients; passing an empty cursor returns the first page.
+    '''
+
+    cursor_param = 'cursor'
+
+    def __init__(self, queryset, page_size, order_by=None):
+        self.queryset = queryset
+        self.page_size = page_size
+        order_by = order_by or 'pk'
+        self.descending = order_by.startswith('-')
+        field_name = order_by.lstrip('-')
+        if field_name == 'id':
+            field_name = 'pk'
+        if field_name == 'pk':
+            self.field = None
+        else:
+            try:
+                self.field = queryset.model._meta.get_field(field_name)
+            except FieldDoesNotExist:
+                raise ValueError('Cannot paginate with a cursor ordered by %s' % order_by)
+            if self.field.null or self.field.rel:
+                raise ValueError('Cannot paginate with a cursor ordered by %s' % order_by)
+        self.field_name = field_name
+        self.order_by = order_by
+
+    def encode_cursor(self, obj, reverse=False):
+        data = {'o': self.order_by, 'pk': obj.pk}
+        if self.field is not None:
+            data['v'] = self.field.value_to_string(obj)
+        if reverse:
+            data['r'] = 1
+        return base64.urlsafe_b64encode(json.dumps(data))
+
+    def decode_cursor(self, cursor):
+        try:
+            data = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            pk = int(data['pk'])
+            value = None
+            if self.field is not None:
+                value = self.field.to_python(data['v'])
+        except (TypeError, ValueError, KeyError):
+            raise ValueError('Invalid cursor')
+        if data.get('o') != self.order_by:
+            raise ValueError('Cursor does not match the requested ordering')
+        return value, pk, bool(data.get('r', False))
+
+    def get_ordering(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = descending and '-' or ''
+        if self.field is None:
+            return (prefix + 'pk',)
+        return (prefix + self.field_name, prefix + 'pk')
+
+    def filter_after(self, qs, value, pk, reverse=False):
+        ''' objects after (value, pk) in the order pages are being read in '''
+        op = (self.descending == reverse) and 'gt' or 'lt'
+        if self.field is None:
+            return qs.filter(**{'pk__%s' % op: pk})
+        return qs.filter(Q(**{'%s__%s' % (self.field_name, op): value}) |
+                         Q(**{self.field_name: value, 'pk__%s' % op: pk}))
+
+    def page(self, cursor=None):
+        '''
+        Return (objects, next_cursor, previous_cursor) for the page following
+        the given cursor.  Cursors are None when there is no such page.
+        '''
+        qs = self.queryset
+        reverse = False
+        if cursor:
+            value, pk, reverse = self.decode_cursor(cursor)
+            qs = self.filter_after(qs, value, pk, reverse)
+        qs = qs.order_by(*self.get_ordering(reverse))
+        objects = list(qs[:self.page_size + 1])
+        has_more = len(objects) > self.page_size
+        objects = objects[:self.page_size]
+        if reverse:
+            objects.reverse()
+        next_cursor = previous_cursor = None
+        if objects:
+            if (has_more and not reverse) or (cursor and reverse):
+                next_cursor = self.encode_cursor(objects[-1])
+            if (has_more and reverse) or (cursor and not reverse):
+                previous_cursor = self.encode_cursor(objects[0], reverse=True)
+        return objects, next_cursor, previous_cursor
+
+    def get_page_url(self, request, cursor):
+        if cursor is None:
+            return None
+        url = request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_param, cursor)
@@ -0,0 +1,151 @@
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Finding playbooks in a project directory.  A playbook is a .yml file (not
+under a roles or tasks directory) holding a YAML list whose first item has
+hosts or an include.
+'''
+
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import yaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+__all__ = ['find_playbook_files', 'classify_playbook', 'classify_playbooks']
+
+logger = logging.getLogger('lib.main.playbooks')
+
+# Directories never containing playbooks; they are not descended into.
+SKIPPED_DIRS = ('roles', 'tasks', '.git', '.hg', '.svn')
+
+# Fewer files than this are not worth starting worker processes for.
+MIN_PARALLEL_FILES = 50
+
+# A hosts or include key, in block or flow style.
+PLAY_KEY_RE = re.compile(r'(^|[\s{,])(hosts|include)\s*:', re.MULTILINE)
+
+def find_playbook_files(local_path):
+    '''
+    Return (relative path, mtime, size) for each candidate playbook file
+    in local_path.
+    '''
+    results = []
+    for dirpath, dirnames, filenames in os.walk(local_path):
+        dirnames[:] = [d for d in dirnames if d not in SKIPPED_DIRS]
+        for filename in filenames:
+            if os.path.splitext(filename)[-1] != '.yml':
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            results.append((os.path.relpath(path, local_path), st.st_mtime,
+                            st.st_size))
+    return results
+
+def looks_like_playbook(content):
+    '''
+    Cheap check of the file contents before parsing: the first statement
+    must start a list, and there must be a hosts or include key.
+    '''
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or line.startswith('---') or \
+           line.startswith('%'):
+            continue
+        if not line.startswith('-') and not line.startswith('['):
+            return False
+        break
+    else:
+        return False
+    return bool(PLAY_KEY_RE.search(content))
+
+def classify_playbook(path):
+    ''' whether the file at path is a playbook '''
+    try:
+        content = file(path).read()
+    except IOError:
+        return False
+    if not looks_like_playbook(content):
+        return False
+    # Only files that look like playbooks are fully parsed.
+    try:
+        data = yaml.load(content, Loader=SafeLoader)
+    except yaml.YAMLError:
+        return False
+    try:
+        return 'hosts' in data[0] or 'include' in data[0]
+    except (TypeError, IndexError, KeyError):
+        return False
+
+def classify_playbooks(paths, processes=1):
+    '''
+    Return whether each file in paths is a playbook, parsing them in worker
+    processes when processes is more than one (None to use one per CPU).
+    Workers run this module as a script instead of being a multiprocessing
+    pool, which can't be started from daemonic processes (such as celery
+    workers, billiard's pool included).
+    '''
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(paths) < MIN_PARALLEL_FILES:
+        return map(classify_playbook, paths)
+    size = -(-len(paths) // processes)
+    chunks = [paths[n:n + size] for n in xrange(0, len(paths), size)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    workers = []
+    try:
+        for chunk in chunks:
+            worker = subprocess.Popen([sys.executable, __file__], env=env,
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE)
+            workers.append(worker)
+            # Workers read all paths before writing any results.
+            worker.stdin.write('\0'.join([
+                path.encode('utf-8') if isinstance(path, unicode) else path
+                for path in chunk]))
+            worker.stdin.close()
+        results = []
+        for worker, chunk in zip(workers, chunks):
+            output = worker.stdout.read()
+            if worker.wait() != 0 or len(output) != len(chunk):
+                raise OSError('playbook worker exited with %s' % worker.returncode)
+            results.extend([c == '1' for c in output])
+        return results
+    except (OSError, IOError):
+        logger.warning('Unable to check %d playbook files in %d processes, '
+                       'checking them in this process instead', len(paths),
+                       processes, exc_info=True)
+        for worker in workers:
+            if worker.poll() is None:
+                worker.kill()
+                worker.wait()
+        return map(classify_playbook, paths)
+
+if __name__ == '__main__':
+    # Worker for classify_playbooks: NUL separated paths are read from
+    # stdin, and a 1 or 0 is written for each of them.
+    for path in sys.stdin.read().split('\0'):
+        sys.stdout.write(classify_playbook(path) and '1' or '0')
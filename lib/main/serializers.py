@@ -17,12 +17,33 @@
 from django.contrib.auth.models import User
 from lib.main.models import *
 from rest_framework import serializers, pagination
-from django.core.urlresolvers import reverse
+from lib.main.url_templates import build_url
 from django.core.serializers import json
 import lib.urls
 
 class BaseSerializer(serializers.ModelSerializer):
-    pass
+
+    def __init__(self, *args, **kwargs):
+        super(BaseSerializer, self).__init__(*args, **kwargs)
+        self.limit_fields()
+
+    def limit_fields(self):
+        '''
+        GET requests can pass fields=id,name to return only some fields, and
+        related=0 to leave out related resource URLs; fields left out are
+        not computed at all.
+        '''
+        request = self.context.get('request', None)
+        if request is None or request.method != 'GET':
+            return
+        fields = request.QUERY_PARAMS.get('fields', '')
+        if fields:
+            wanted = set([f.strip() for f in fields.split(',')])
+            for name in self.fields.keys():
+                if name not in wanted:
+                    del self.fields[name]
+        if request.QUERY_PARAMS.get('related', '') in ('0', 'false', 'False'):
+            self.fields.pop('related', None)
 
 class OrganizationSerializer(BaseSerializer):
 
@@ -42,15 +63,15 @@ class OrganizationSerializer(BaseSerializer):
         ''' related resource URLs '''
 
         res = dict(
-            audit_trail = reverse(lib.urls.views_OrganizationsAuditTrailList, args=(obj.pk,)),
-            projects    = reverse(lib.urls.views_OrganizationsProjectsList,   args=(obj.pk,)),
-            users       = reverse(lib.urls.views_OrganizationsUsersList,      args=(obj.pk,)),
-            admins      = reverse(lib.urls.views_OrganizationsAdminsList,     args=(obj.pk,)),
-            tags        = reverse(lib.urls.views_OrganizationsTagsList,       args=(obj.pk,)),
-            teams       = reverse(lib.urls.views_OrganizationsTeamsList,      args=(obj.pk,)),
+            audit_trail = build_url(lib.urls.views_OrganizationsAuditTrailList, obj.pk),
+            projects    = build_url(lib.urls.views_OrganizationsProjectsList,   obj.pk),
+            users       = build_url(lib.urls.views_OrganizationsUsersList,      obj.pk),
+            admins      = build_url(lib.urls.views_OrganizationsAdminsList,     obj.pk),
+            tags        = build_url(lib.urls.views_OrganizationsTagsList,       obj.pk),
+            teams       = build_url(lib.urls.views_OrganizationsTeamsList,      obj.pk),
         )
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
 
         return res
 
@@ -62,12 +83,12 @@ class AuditTrailSerializer(BaseSerializer):
 
     class Meta:
         model = AuditTrail
-        fields = ('url', 'id', 'modified_by', 'delta', 'detail', 'comment')
+        fields = ('url', 'id', 'related', 'modified_by', 'delta', 'detail', 'comment')
 
     def get_related(self, obj):
         res = dict()
-        if obj.modified_by:
-            res['modified_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.modified_by.pk,))
+        if obj.modified_by_id:
+            res['modified_by']  = build_url(lib.urls.views_UsersDetail, obj.modified_by_id)
         return res
 
 class ProjectSerializer(BaseSerializer):
@@ -78,14 +99,14 @@ class ProjectSerializer(BaseSerializer):
 
     class Meta:
         model = Project
-        fields = ('url', 'id', 'name', 'description', 'creation_date', 'local_path')#, 'default_playbook', 'scm_type')
+        fields = ('url', 'id', 'related', 'name', 'description', 'creation_date', 'local_path')#, 'default_playbook', 'scm_type')
 
     def get_related(self, obj):
         res = dict(
-            organizations = reverse(lib.urls.views_ProjectsOrganizationsList, args=(obj.pk,)),
+            organizations = build_url(lib.urls.views_ProjectsOrganizationsList, obj.pk),
         )
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
 
 
@@ -97,16 +118,17 @@ class InventorySerializer(BaseSerializer):
 
     class Meta:
         model = Inventory
-        fields = ('url', 'id', 'name', 'description', 'creation_date', 'organization')
+        fields = ('url', 'id', 'related', 'name', 'description', 'creation_date', 'organization',
+                  'hosts_with_active_failures')
 
     def get_related(self, obj):
         res = dict(
-            hosts        = reverse(lib.urls.views_HostsList,           args=(obj.pk,)),
-            groups       = reverse(lib.urls.views_GroupsList,          args=(obj.pk,)),
-            organization = reverse(lib.urls.views_OrganizationsDetail, args=(obj.organization.pk,)),
+            hosts        = build_url(lib.urls.views_InventoryHostsList,  obj.pk),
+            groups       = build_url(lib.urls.views_InventoryGroupsList, obj.pk),
+            organization = build_url(lib.urls.views_OrganizationsDetail, obj.organization_id),
         )
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
 
 class HostSerializer(BaseSerializer):
@@ -117,16 +139,19 @@ class HostSerializer(BaseSerializer):
 
     class Meta:
         model = Host
-        fields = ('url', 'id', 'name', 'description', 'creation_date', 'inventory')
+        fields = ('url', 'id', 'related', 'name', 'description', 'creation_date', 'inventory',
+                  'last_job', 'last_job_host_summary', 'has_active_failures')
 
     def get_related(self, obj):
         res = dict(
-            variable_data = reverse(lib.urls.views_HostsVariableDetail, args=(obj.pk,)),
-            inventory     = reverse(lib.urls.views_InventoryDetail,     args=(obj.inventory.pk,)),
+            variable_data = build_url(lib.urls.views_HostsVariableDetail, obj.pk),
+            inventory     = build_url(lib.urls.views_InventoryDetail,     obj.inventory_id),
         )
+        if obj.last_job_id:
+            res['last_job'] = build_url(lib.urls.views_JobsDetail, obj.last_job_id)
         # NICE TO HAVE: possible reverse resource to show what groups the host is in
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
 
 class GroupSerializer(BaseSerializer):
@@ -137,18 +162,18 @@ class GroupSerializer(BaseSerializer):
 
     class Meta:
         model = Group
-        fields = ('url', 'id', 'name', 'description', 'creation_date', 'inventory')
+        fields = ('url', 'id', 'related', 'name', 'description', 'creation_date', 'inventory')
 
     def get_related(self, obj):
         res = dict(
-            variable_data = reverse(lib.urls.views_GroupsVariableDetail, args=(obj.pk,)),
-            hosts         = reverse(lib.urls.views_GroupsHostsList,      args=(obj.pk,)),
-            children      = reverse(lib.urls.views_GroupsChildrenList,   args=(obj.pk,)),
-            all_hosts     = reverse(lib.urls.views_GroupsAllHostsList,   args=(obj.pk,)),
-            inventory     = reverse(lib.urls.views_InventoryDetail,      args=(obj.inventory.pk,)),
+            variable_data = build_url(lib.urls.views_GroupsVariableDetail, obj.pk),
+            hosts         = build_url(lib.urls.views_GroupsHostsList,      obj.pk),
+            children      = build_url(lib.urls.views_GroupsChildrenList,   obj.pk),
+            all_hosts     = build_url(lib.urls.views_GroupsAllHostsList,   obj.pk),
+            inventory     = build_url(lib.urls.views_InventoryDetail,      obj.inventory_id),
         )
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
 
 class TeamSerializer(BaseSerializer):
@@ -165,14 +190,15 @@ class TeamSerializer(BaseSerializer):
 
     def get_related(self, obj):
         res = dict(
-            projects     = reverse(lib.urls.views_TeamsProjectsList,     args=(obj.pk,)),
-            users        = reverse(lib.urls.views_TeamsUsersList,        args=(obj.pk,)),
-            credentials  = reverse(lib.urls.views_TeamsCredentialsList,  args=(obj.pk,)),
-            organization = reverse(lib.urls.views_OrganizationsDetail,   args=(obj.organization.pk,)),
-            permissions  = reverse(lib.urls.views_TeamsPermissionsList,  args=(obj.pk,)),
+            projects     = build_url(lib.urls.views_TeamsProjectsList,     obj.pk),
+            users        = build_url(lib.urls.views_TeamsUsersList,        obj.pk),
+            credentials  = build_url(lib.urls.views_TeamsCredentialsList,  obj.pk),
+            permissions  = build_url(lib.urls.views_TeamsPermissionsList,  obj.pk),
         )
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.organization_id:
+            res['organization'] = build_url(lib.urls.views_OrganizationsDetail, obj.organization_id)
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
 
 class PermissionSerializer(BaseSerializer):
@@ -182,21 +208,22 @@ class PermissionSerializer(BaseSerializer):
 
     class Meta:
         model = Permission
-        fields = ( 'url', 'id', 'user', 'team', 'name', 'description', 'creation_date',
+        fields = ( 'url', 'id', 'related', 'user', 'team', 'name', 'description', 'creation_date',
                    'project', 'inventory', 'permission_type' )
          
     def get_related(self, obj):
         res = dict()
-        if obj.user:
-            res['user']        = reverse(lib.urls.views_UsersDetail, args=(obj.user.pk,))
-        if obj.team:
-            res['team']        = reverse(lib.urls.views_TeamsDetail, args=(obj.team.pk,))
-        if self.project:
-            res['project']     = reverse(lib.urls.views_ProjectsDetail, args=(obj.project.pk,)) 
-        if self.inventory:
-            res['inventory']   = reverse(lib.urls.views_InventoryDetail, args=(obj.inventory.pk,))
-        if self.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.user_id:
+            res['user']        = build_url(lib.urls.views_UsersDetail, obj.user_id)
+        if obj.team_id:
+            res['team']        = build_url(lib.urls.views_TeamsDetail, obj.team_id)
+        if obj.project_id:
+            res['project']     = build_url(lib.urls.views_ProjectsDetail, obj.project_id)
+        if obj.inventory_id:
+            res['inventory']   = build_url(lib.urls.views_InventoryDetail, obj.inventory_id)
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
+        return res
 
 class CredentialSerializer(BaseSerializer):
 
@@ -217,12 +244,12 @@ class CredentialSerializer(BaseSerializer):
         # FIXME: no related collections, do want to add user and team if defined
         res = dict(
         )
-        if obj.user:
-            res['user']        = reverse(lib.urls.views_UsersDetail, args=(obj.user.pk,))
-        if obj.team:
-            res['team']        = reverse(lib.urls.views_TeamsDetail, args=(obj.team.pk,))
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.user_id:
+            res['user']        = build_url(lib.urls.views_UsersDetail, obj.user_id)
+        if obj.team_id:
+            res['team']        = build_url(lib.urls.views_TeamsDetail, obj.team_id)
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
 
     def validate(self, attrs):
@@ -247,17 +274,17 @@ class UserSerializer(BaseSerializer):
 
     def get_related(self, obj):
         return dict(
-            teams                  = reverse(lib.urls.views_UsersTeamsList,              args=(obj.pk,)),
-            organizations          = reverse(lib.urls.views_UsersOrganizationsList,      args=(obj.pk,)),
-            admin_of_organizations = reverse(lib.urls.views_UsersAdminOrganizationsList, args=(obj.pk,)),
-            projects               = reverse(lib.urls.views_UsersProjectsList,           args=(obj.pk,)),
-            credentials            = reverse(lib.urls.views_UsersCredentialsList,        args=(obj.pk,)),
-            permissions            = reverse(lib.urls.views_UsersPermissionsList,        args=(obj.pk,)),
+            teams                  = build_url(lib.urls.views_UsersTeamsList,              obj.pk),
+            organizations          = build_url(lib.urls.views_UsersOrganizationsList,      obj.pk),
+            admin_of_organizations = build_url(lib.urls.views_UsersAdminOrganizationsList, obj.pk),
+            projects               = build_url(lib.urls.views_UsersProjectsList,           obj.pk),
+            credentials            = build_url(lib.urls.views_UsersCredentialsList,        obj.pk),
+            permissions            = build_url(lib.urls.views_UsersPermissionsList,        obj.pk),
         )
 
     def get_absolute_url_override(self, obj):
         import lib.urls
-        return reverse(lib.urls.views_UsersDetail, args=(obj.pk,))
+        return build_url(lib.urls.views_UsersDetail, obj.pk)
 
 
 class TagSerializer(BaseSerializer):
@@ -288,8 +315,8 @@ class VariableDataSerializer(BaseSerializer):
         # FIXME: add host or group if defined
         res = dict(
         )
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
 
 class JobTemplateSerializer(BaseSerializer):
@@ -306,8 +333,8 @@ class JobTemplateSerializer(BaseSerializer):
         # FIXME: fill in once further defined.  related resources, credential, project, inventory, etc
         res = dict(
         )
-        if obj.created_by:
-            res['created_by']  = reverse(lib.urls.views_UsersDetail, args=(obj.created_by.pk,))
+        if obj.created_by_id:
+            res['created_by']  = build_url(lib.urls.views_UsersDetail, obj.created_by_id)
         return res
     
 
@@ -14,23 +14,198 @@
 # You should have received a copy of the GNU General Public License
 # along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
 
-import cStringIO
+import errno
+import json
 import logging
 import os
+import re
 import select
+import shutil
+import socket
 import subprocess
 import tempfile
+import threading
 import time
 import traceback
 from celery import Task
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 import pexpect
 from lib.main.models import *
 
-__all__ = ['RunJob']
+__all__ = ['RunJob', 'ScanPlaybooks']
 
 logger = logging.getLogger('lib.main.tasks')
 
+class JobEventWriter(object):
+    '''
+    Collect events for a job in memory and write them to the database in
+    batches using bulk_create, flushing every JOB_EVENT_BATCH_SIZE events or
+    JOB_EVENT_FLUSH_INTERVAL milliseconds, whichever comes first.
+    '''
+
+    def __init__(self, job_pk, batch_size=None, flush_interval=None):
+        self.job = Job.objects.get(pk=job_pk)
+        if batch_size is None:
+            batch_size = getattr(settings, 'JOB_EVENT_BATCH_SIZE', 100)
+        if flush_interval is None:
+            flush_interval = getattr(settings, 'JOB_EVENT_FLUSH_INTERVAL', 500)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval / 1000.0
+        # Hosts are looked up once by name, rather than by JobEvent.save()
+        # for every event.
+        self.host_ids = dict(Host.objects.filter(
+            inventory__pk=self.job.inventory_id,
+        ).values_list('name', 'pk'))
+        self.pending = []
+        self.pending_since = None
+
+    def add(self, event, event_data):
+        job_event = JobEvent(job=self.job, event=event, event_data=event_data)
+        try:
+            job_event.host_id = self.host_ids.get(event_data.get('host', ''), None)
+        except (AttributeError, TypeError):
+            pass
+        if not self.pending:
+            self.pending_since = time.time()
+        self.pending.append(job_event)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def time_until_flush(self):
+        '''
+        Return the number of seconds until pending events should be written,
+        or None if there are no pending events.
+        '''
+        if not self.pending:
+            return None
+        return max(0, self.pending_since + self.flush_interval - time.time())
+
+    def flush_if_due(self):
+        if self.pending and not self.time_until_flush():
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        job_events, self.pending = self.pending, []
+        JobEvent.prepare_event_data(job_events)
+        JobEvent.objects.bulk_create(job_events)
+        update_job_events_generation(self.job.pk)
+        # bulk_create doesn't call save(), so update host summaries here.
+        for job_event in job_events:
+            job_event.update_host_summary_from_stats()
+
+class CallbackReceiver(threading.Thread):
+    '''
+    Listen on a Unix domain socket for newline-delimited JSON events sent by
+    the callback plugin and store them for the given job.  Each process
+    started by ansible-playbook keeps one connection open for all of its
+    events, instead of running the callback event script once per event.
+    '''
+
+    def __init__(self, job_pk):
+        super(CallbackReceiver, self).__init__(name='callback-receiver-%d' % job_pk)
+        self.daemon = True
+        self.job_pk = job_pk
+        self.socket_dir = tempfile.mkdtemp(prefix='acom_callback_')
+        self.socket_path = os.path.join(self.socket_dir, 'callback.sock')
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen(16)
+        self.valid_events = set([x[0] for x in JobEvent.EVENT_TYPES])
+        self._stop_event = threading.Event()
+        self._buffers = {}
+        self.writer = None
+
+    def handle_line(self, line):
+        '''
+        Store a single JSON-encoded event received from the callback plugin.
+        '''
+        try:
+            data = json.loads(line)
+            event = data['event']
+            event_data = data.get('event_data', {})
+        except (ValueError, TypeError, KeyError):
+            logger.warning('Invalid callback event for job %d: %r',
+                           self.job_pk, line[:200])
+            return
+        if event not in self.valid_events:
+            logger.warning('Unsupported callback event for job %d: %r',
+                           self.job_pk, event)
+            return
+        self.writer.add(event, event_data)
+
+    def handle_data(self, sock):
+        '''
+        Read available data from a client connection and process complete
+        lines.  Return False once the client has closed its connection.
+        '''
+        data = sock.recv(65536)
+        buf = self._buffers.get(sock, '') + data
+        lines = buf.split('\n')
+        self._buffers[sock] = lines.pop()
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                self.handle_line(line)
+            except Exception:
+                logger.exception('Error storing callback event for job %d',
+                                 self.job_pk)
+        return bool(data)
+
+    def run(self):
+        clients = []
+        try:
+            self.writer = JobEventWriter(self.job_pk)
+            while True:
+                timeout = self.writer.time_until_flush()
+                if timeout is None or timeout > 0.1:
+                    timeout = 0.1
+                readable = select.select([self.listener] + clients, [], [], timeout)[0]
+                if not readable and self._stop_event.is_set():
+                    break
+                for sock in readable:
+                    if sock is self.listener:
+                        clients.append(self.listener.accept()[0])
+                        continue
+                    try:
+                        if self.handle_data(sock):
+                            continue
+                    except socket.error:
+                        logger.exception('Error receiving callback events '
+                                         'for job %d', self.job_pk)
+                    clients.remove(sock)
+                    self._buffers.pop(sock, None)
+                    sock.close()
+                self.writer.flush_if_due()
+        except Exception:
+            logger.exception('Error in callback receiver for job %d',
+                             self.job_pk)
+        finally:
+            for sock in clients:
+                sock.close()
+            try:
+                if self.writer:
+                    self.writer.flush()
+            except Exception:
+                logger.exception('Error storing callback events for job %d',
+                                 self.job_pk)
+            connection.close()
+
+    def stop(self):
+        '''
+        Process any events still waiting to be read and write the final
+        batch, then stop the receiver and remove its socket.
+        '''
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.listener.close()
+        shutil.rmtree(self.socket_dir, True)
+
 
 class RunJob(Task):
     '''
@@ -71,6 +246,71 @@ class RunJob(Task):
         else:
             return ''
 
+    def render_inventory_ini(self, data):
+        '''
+        Return inventory script data as a static INI inventory, or None if it
+        contains names or variables that can't be represented exactly in that
+        format (INI variables are always strings to ansible).
+        '''
+        name_re = re.compile(r'^[^\s\[\]:#=\'"\\]+$')
+        key_re = re.compile(r'^\w+$')
+        value_re = re.compile(r'^[^\s#=\'"\\]+$')
+        def check_name(name):
+            if not name_re.match(name):
+                raise ValueError(name)
+            return name
+        def format_vars(variables):
+            items = []
+            for key, value in sorted(variables.items()):
+                if not isinstance(value, basestring) or \
+                   not key_re.match(key) or not value_re.match(value):
+                    raise ValueError(key)
+                items.append(u'%s=%s' % (key, value))
+            return items
+        hostvars = data.get('_meta', {}).get('hostvars', {})
+        lines = []
+        try:
+            for name, group_info in sorted(data.items()):
+                if name == '_meta':
+                    continue
+                if not isinstance(group_info, dict):
+                    group_info = {'hosts': group_info}
+                lines.append(u'[%s]' % check_name(name))
+                for host in group_info.get('hosts', []):
+                    host_vars = format_vars(hostvars.get(host, {}))
+                    lines.append(u' '.join([check_name(host)] + host_vars))
+                if group_info.get('children', []):
+                    lines.append(u'[%s:children]' % name)
+                    lines.extend(map(check_name, group_info['children']))
+                if group_info.get('vars', {}):
+                    lines.append(u'[%s:vars]' % name)
+                    lines.extend(format_vars(group_info['vars']))
+                lines.append(u'')
+        except ValueError:
+            return None
+        return u'\n'.join(lines).encode('utf-8')
+
+    def build_inventory_path(self, job, **kwargs):
+        '''
+        Write the inventory for the job to a temporary directory, either as a
+        static INI file read directly by ansible-playbook, or as JSON read by
+        the acom_snapshot.py inventory script (see INVENTORY_FILE_FORMAT).
+        '''
+        data = job.inventory.get_cached_script_data()
+        content = None
+        if getattr(settings, 'INVENTORY_FILE_FORMAT', 'json') == 'ini':
+            content = self.render_inventory_ini(data)
+        path = tempfile.mkdtemp(prefix='acom_inventory_')
+        if content is None:
+            path = os.path.join(path, 'inventory.json')
+            content = json.dumps(data)
+        else:
+            path = os.path.join(path, 'inventory.ini')
+        f = open(path, 'w')
+        f.write(content)
+        f.close()
+        return path
+
     def build_passwords(self, job, **kwargs):
         '''
         Build a dictionary of passwords for SSH private key, SSH user and sudo.
@@ -98,6 +338,10 @@ class RunJob(Task):
         env['ACOM_INVENTORY_ID'] = str(job.inventory.pk)
         env['ANSIBLE_CALLBACK_PLUGINS'] = plugin_dir
         env['ACOM_CALLBACK_EVENT_SCRIPT'] = callback_script
+        if kwargs.get('inventory_path', ''):
+            env['ACOM_INVENTORY_FILE'] = kwargs['inventory_path']
+        if kwargs.get('callback_socket', ''):
+            env['ACOM_CALLBACK_EVENT_SOCKET'] = kwargs['callback_socket']
         if hasattr(settings, 'ANSIBLE_TRANSPORT'):
             env['ANSIBLE_TRANSPORT'] = getattr(settings, 'ANSIBLE_TRANSPORT')
         env['ANSIBLE_NOCOLOR'] = '1' # Prevent output of escape sequences.
@@ -115,9 +359,16 @@ class RunJob(Task):
             sudo_username = kwargs.get('sudo_username', creds.sudo_username)
         ssh_username = ssh_username or 'root'
         sudo_username = sudo_username or 'root'
-        inventory_script = self.get_path_to('management', 'commands',
-                                            'acom_inventory.py')
-        args = ['ansible-playbook', '-i', inventory_script]
+        inventory_path = kwargs.get('inventory_path', '')
+        if inventory_path.endswith('.json'):
+            inventory = self.get_path_to('..', 'plugins', 'inventory',
+                                         'acom_snapshot.py')
+        elif inventory_path:
+            inventory = inventory_path
+        else:
+            inventory = self.get_path_to('management', 'commands',
+                                         'acom_inventory.py')
+        args = ['ansible-playbook', '-i', inventory]
         if job.job_type == 'check':
             args.append('--check')
         args.append('--user=%s' % ssh_username)
@@ -147,14 +398,56 @@ class RunJob(Task):
             args = ['ssh-agent', 'sh', '-c', cmd]
         return args
 
-    def run_pexpect(self, job_pk, args, cwd, env, passwords):
+    def build_stdout_path(self, job, **kwargs):
+        '''
+        Return the path of the file used to capture output from
+        ansible-playbook, creating the output directory if needed.
+        '''
+        if not os.path.exists(settings.JOBOUTPUT_ROOT):
+            os.makedirs(settings.JOBOUTPUT_ROOT)
+        return os.path.join(settings.JOBOUTPUT_ROOT, '%d.out' % job.pk)
+
+    def open_cancel_socket(self, job, **kwargs):
+        '''
+        Bind the socket used by Job.cancel() to notify this task that the job
+        has been canceled.  Returns None if it can't be bound (e.g. the path
+        is too long), in which case only the database is checked.
+        '''
+        path = job.cancel_socket_path
+        if os.path.exists(path):
+            os.remove(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(path)
+        except socket.error:
+            logger.exception('Unable to bind cancel socket %s for job %d',
+                             path, job.pk)
+            sock.close()
+            return None
+        return sock
+
+    def check_cancel_flag(self, job_pk):
+        return Job.objects.filter(pk=job_pk).values_list('cancel_flag', flat=True)[0]
+
+    def run_pexpect(self, job_pk, args, cwd, env, passwords, logfile,
+                    cancel_socket):
         '''
         Run the job using pexpect to capture output and provide passwords when
-        requested.
+        requested.  Output is appended to logfile as it is received.  Waits on
+        the child and cancel_socket together, so the database is only checked
+        for cancel_flag when notified.  In case a notification was missed,
+        the key set in the cache by Job.cancel() is checked every
+        JOB_CANCEL_POLL_INTERVAL seconds, and the database every
+        JOB_CANCEL_DB_POLL_INTERVAL seconds.
         '''
-        status, stdout, stderr = 'error', '', ''
-        logfile = cStringIO.StringIO()
-        logfile_pos = logfile.tell()
+        status, stderr = 'error', ''
+        # Job may have been canceled before the cancel socket was bound.
+        if self.check_cancel_flag(job_pk):
+            return 'canceled', stderr
+        poll_interval = getattr(settings, 'JOB_CANCEL_POLL_INTERVAL', 2)
+        db_poll_interval = getattr(settings, 'JOB_CANCEL_DB_POLL_INTERVAL', 60)
+        next_poll = time.time() + poll_interval
+        next_db_poll = time.time() + db_poll_interval
         child = pexpect.spawn(args[0], args[1:], cwd=cwd, env=env)
         child.logfile_read = logfile
         job_canceled = False
@@ -167,20 +460,36 @@ class RunJob(Task):
                 pexpect.TIMEOUT,
                 pexpect.EOF,
             ]
-            result_id = child.expect(expect_list, timeout=2)
-            if result_id == 0:
-                child.sendline(passwords.get('ssh_key_unlock', ''))
-            elif result_id == 1:
-                child.sendline('')
-            elif result_id == 2:
-                child.sendline(passwords.get('sudo_password', ''))
-            elif result_id == 3:
-                child.sendline(passwords.get('ssh_password', ''))
-            job_updates = {}
-            if logfile_pos != logfile.tell():
-                job_updates['result_stdout'] = logfile.getvalue()
-            job = self.update_job(job_pk, **job_updates)
-            if job.cancel_flag:
+            timeout = max(0, min(next_poll, next_db_poll) - time.time())
+            try:
+                readable = select.select([child.child_fd] + filter(None, [cancel_socket]),
+                                         [], [], timeout)[0]
+            except select.error, e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if child.child_fd in readable:
+                result_id = child.expect(expect_list, timeout=0)
+                if result_id == 0:
+                    child.sendline(passwords.get('ssh_key_unlock', ''))
+                elif result_id == 1:
+                    child.sendline('')
+                elif result_id == 2:
+                    child.sendline(passwords.get('sudo_password', ''))
+                elif result_id == 3:
+                    child.sendline(passwords.get('ssh_password', ''))
+            check_cancel = False
+            if cancel_socket and cancel_socket in readable:
+                cancel_socket.recv(64)
+                check_cancel = True
+            if time.time() >= next_poll:
+                next_poll = time.time() + poll_interval
+                if cache.get(JOB_CANCELED_KEY % job_pk):
+                    check_cancel = True
+            if time.time() >= next_db_poll:
+                next_db_poll = time.time() + db_poll_interval
+                check_cancel = True
+            if check_cancel and self.check_cancel_flag(job_pk):
                 child.close(True)
                 job_canceled = True
         if job_canceled:
@@ -189,30 +498,72 @@ class RunJob(Task):
             status = 'successful'
         else:
             status = 'failed'
-        stdout = logfile.getvalue()
-        return status, stdout, stderr
+        return status, stderr
 
     def run(self, job_pk, **kwargs):
         '''
         Run the job using ansible-playbook and capture its output.
         '''
         job = self.update_job(job_pk, status='running')
-        status, stdout, stderr, tb = 'error', '', '', ''
+        status, stderr, tb = 'error', '', ''
+        receiver, logfile, cancel_socket = None, None, None
         try:
+            stdout_path = self.build_stdout_path(job, **kwargs)
+            logfile = open(stdout_path, 'wb')
+            job = self.update_job(job_pk, result_stdout_file=stdout_path)
+            cancel_socket = self.open_cancel_socket(job, **kwargs)
+            receiver = CallbackReceiver(job_pk)
+            receiver.start()
+            kwargs['callback_socket'] = receiver.socket_path
+            render_started = time.time()
+            kwargs['inventory_path'] = self.build_inventory_path(job, **kwargs)
+            job = self.update_job(job_pk, inventory_render_time=\
+                                  time.time() - render_started)
             kwargs['ssh_key_path'] = self.build_ssh_key_path(job, **kwargs)
             kwargs['passwords'] = self.build_passwords(job, **kwargs)
             args = self.build_args(job, **kwargs)
             cwd = job.project.local_path
             env = self.build_env(job, **kwargs)
-            status, stdout, stderr = self.run_pexpect(job_pk, args, cwd, env,
-                                                      kwargs['passwords'])
+            status, stderr = self.run_pexpect(job_pk, args, cwd, env,
+                                              kwargs['passwords'], logfile,
+                                              cancel_socket)
         except Exception:
             tb = traceback.format_exc()
         finally:
+            if logfile:
+                logfile.close()
+            if receiver:
+                receiver.stop()
+            if cancel_socket:
+                cancel_socket.close()
+                try:
+                    os.remove(job.cancel_socket_path)
+                except OSError:
+                    pass
+            if kwargs.get('inventory_path', ''):
+                shutil.rmtree(os.path.dirname(kwargs['inventory_path']), True)
             if kwargs.get('ssh_key_path', ''):
                 try:
                     os.remove(kwargs['ssh_key_path'])
                 except IOError:
                     pass
-        self.update_job(job_pk, status=status, result_stdout=stdout,
-                        result_stderr=stderr, result_traceback=tb)
+        self.update_job(job_pk, status=status, result_stderr=stderr,
+                        result_traceback=tb)
+
+class ScanPlaybooks(Task):
+    '''
+    Celery task to update the playbook index of projects (all active projects
+    by default), e.g. after a large checkout, so that web requests find it
+    up to date.
+    '''
+
+    name = 'scan_playbooks'
+
+    def run(self, project_pks=None, processes=None, **kwargs):
+        projects = Project.objects.filter(active=True)
+        if project_pks is not None:
+            projects = projects.filter(pk__in=project_pks)
+        results = {}
+        for project in projects:
+            results[project.pk] = project.update_playbook_index(processes)
+        return results
@@ -22,6 +22,7 @@ import tempfile
 
 from django.conf import settings
 from django.contrib.auth.models import User as DjangoUser
+from django.core.cache import cache
 import django.test
 from django.test.client import Client
 from lib.main.models import *
@@ -36,12 +37,20 @@ class BaseTestMixin(object):
         super(BaseTestMixin, self).setUp()
         self.object_ctr = 0
         self._temp_project_dirs = []
+        self._temp_files = []
+        # Primary keys are reused between tests, so don't keep cached data.
+        cache.clear()
 
     def tearDown(self):
         super(BaseTestMixin, self).tearDown()
         for project_dir in self._temp_project_dirs:
             if os.path.exists(project_dir):
                 shutil.rmtree(project_dir, True)
+        for job in Job.objects.exclude(result_stdout_file=''):
+            self._temp_files.append(job.result_stdout_file)
+        for temp_file in self._temp_files:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
 
     def make_user(self, username, password, super_user=False):
         django_user = None
@@ -27,7 +27,8 @@ from lib.main.models import *
 from lib.main.tests.base import BaseTest
 
 __all__ = ['RunCommandAsScriptTest', 'AcomInventoryTest',
-           'AcomCallbackEventTest']
+           'AcomCallbackEventTest', 'AcomScanPlaybooksTest',
+           'AcomImportInventoryTest']
 
 class BaseCommandTest(BaseTest):
     '''
@@ -163,6 +164,11 @@ class AcomInventoryTest(BaseCommandTest):
                                                   inventory_id=inventory.pk)
         self.assertEqual(result, None)
         data = json.loads(stdout)
+        # Hosts for this inventory have no variable data.
+        hostvars = data.pop('_meta')['hostvars']
+        self.assertEqual(set(hostvars.keys()),
+                         set(inventory.hosts.values_list('name', flat=True)))
+        self.assertFalse(any(hostvars.values()))
         self.assertEqual(set(data.keys()),
                          set(inventory.groups.values_list('name', flat=True)))
         # Groups for this inventory should only have hosts, and no group
@@ -185,9 +191,16 @@ class AcomInventoryTest(BaseCommandTest):
     def test_list_with_inventory_id_in_environment(self):
         inventory = self.inventories[1]
         os.environ['ACOM_INVENTORY_ID'] = str(inventory.pk)
-        result, stdout, stderr = self.run_command('acom_inventory', list=True)
+        # The number of queries doesn't depend on the size of the inventory.
+        with self.assertNumQueries(6):
+            result, stdout, stderr = self.run_command('acom_inventory', list=True)
         self.assertEqual(result, None)
         data = json.loads(stdout)
+        # Host variables are included so --host isn't needed for each host.
+        hostvars = data.pop('_meta')['hostvars']
+        for host in inventory.hosts.all():
+            self.assertEqual(hostvars[host.name],
+                             json.loads(host.variable_data.data))
         self.assertEqual(set(data.keys()),
                          set(inventory.groups.values_list('name', flat=True)))
         # Groups for this inventory should have hosts, variable data, and one
@@ -206,6 +219,39 @@ class AcomInventoryTest(BaseCommandTest):
             else:
                 self.assertFalse('children' in v)
 
+    def test_list_cached_until_inventory_changes(self):
+        inventory = self.inventories[1]
+        os.environ['ACOM_INVENTORY_ID'] = str(inventory.pk)
+        result, stdout, stderr = self.run_command('acom_inventory', list=True)
+        self.assertEqual(result, None)
+        # Nothing has changed, only the inventory version is checked.
+        with self.assertNumQueries(2):
+            result, stdout2, stderr = self.run_command('acom_inventory', list=True)
+        self.assertEqual(json.loads(stdout), json.loads(stdout2))
+        # Changing hosts, groups, variables or group membership updates the
+        # inventory version so the data is built again.
+        host = inventory.hosts.get(name='host-01-00.example.com')
+        group = inventory.groups.get(name='group-0')
+        def update_host_variables():
+            host.variable_data.data = json.dumps({'ho': 'changed'})
+            host.variable_data.save()
+        changes = [
+            lambda: inventory.hosts.create(name='new-host', inventory=inventory),
+            lambda: group.hosts.add(inventory.hosts.get(name='new-host')),
+            lambda: inventory.groups.get(name='group-2').parents.add(group),
+            update_host_variables,
+            lambda: group.delete(),
+        ]
+        for change in changes:
+            version = Inventory.objects.get(pk=inventory.pk).version
+            change()
+            self.assertTrue(Inventory.objects.get(pk=inventory.pk).version > version)
+        result, stdout, stderr = self.run_command('acom_inventory', list=True)
+        data = json.loads(stdout)
+        self.assertEqual(data['_meta']['hostvars']['new-host'], {})
+        self.assertEqual(data['_meta']['hostvars'][host.name], {'ho': 'changed'})
+        self.assertFalse('group-0' in data)
+
     def test_valid_host(self):
         # Host without variable data.
         inventory = self.inventories[0]
@@ -419,3 +465,187 @@ class AcomCallbackEventTest(BaseCommandTest):
         result, stdout, stderr = self.run_command('acom_callback_event', **kwargs)
         self.assertEqual(result, None)
         self.assertEqual(self.job.job_events.count(), 4)
+
+class AcomScanPlaybooksTest(BaseCommandTest):
+    '''
+    Test cases for acom_scan_playbooks management command.
+    '''
+
+    def setUp(self):
+        super(AcomScanPlaybooksTest, self).setUp()
+        self.setup_users()
+        self.project = self.make_projects(self.normal_django_user, 1)[0]
+        # Enough files for the scan to use a pool of processes.
+        for x in xrange(60):
+            f = file(os.path.join(self.project.local_path, 'play%02d.yml' % x), 'wb')
+            if x % 3:
+                f.write('- hosts: all\n  tasks:\n  - ping:\n')
+            else:
+                f.write('- name: not a play\n  ping:\n')
+            f.close()
+
+    def test_scan(self):
+        result, stdout, stderr = self.run_command('acom_scan_playbooks',
+                                                  str(self.project.pk),
+                                                  processes=2)
+        self.assertEqual(result, None)
+        self.assertTrue('40 playbooks in 60 files, 60 checked' in stdout)
+        self.assertTrue('files/sec' in stdout)
+        self.assertEqual(self.project.playbook_files.filter(is_playbook=True).count(), 40)
+        self.assertEqual(len(self.project.available_playbooks), 40)
+        # Unchanged files aren't checked again.
+        result, stdout, stderr = self.run_command('acom_scan_playbooks',
+                                                  str(self.project.pk))
+        self.assertTrue('40 playbooks in 60 files, 0 checked' in stdout)
+        result, stdout, stderr = self.run_command('acom_scan_playbooks', full=True)
+        self.assertTrue('40 playbooks in 60 files' in stdout)
+        result, stdout, stderr = self.run_command('acom_scan_playbooks', '9999')
+        self.assertTrue(isinstance(result, CommandError))
+
+    def test_task(self):
+        from lib.main.tasks import ScanPlaybooks
+        results = ScanPlaybooks().run([self.project.pk], processes=2)
+        self.assertEqual(len(results[self.project.pk]), 40)
+
+TEST_INVENTORY_INI = '''
+lb.example.com
+
+[web]
+web[01:03].example.com http_port=8080
+db.example.com:5432
+
+[web:vars]
+ntp_server=ntp.example.com
+
+[db]
+db.example.com
+
+[servers:children]
+web
+db
+'''
+
+TEST_INVENTORY_SCRIPT = '''#!/usr/bin/env python
+import json
+print json.dumps({
+    'web': ['web01.example.com', 'web04.example.com'],
+    'dc': {'hosts': ['lb.example.com'], 'children': ['servers'],
+           'vars': {'region': 'east'}},
+    '_meta': {'hostvars': {'web04.example.com': {'http_port': 80}}},
+})
+'''
+
+class AcomImportInventoryTest(BaseCommandTest):
+    '''
+    Test cases for acom_import_inventory management command.
+    '''
+
+    def setUp(self):
+        super(AcomImportInventoryTest, self).setUp()
+        self.setup_users()
+        self.organization = self.make_organizations(self.super_django_user, 1)[0]
+        self.inventory = Inventory.objects.create(name='test-inventory',
+                                                  organization=self.organization)
+        self.existing_host = self.inventory.hosts.create(name='db.example.com',
+                                                         inventory=self.inventory)
+
+    def write_source(self, content, suffix='', executable=False):
+        h, tf = tempfile.mkstemp(suffix=suffix)
+        self._temp_files.append(tf)
+        os.write(h, content)
+        os.close(h)
+        if executable:
+            os.chmod(tf, 0700)
+        return tf
+
+    def get_host_vars(self, name):
+        variable_data = self.inventory.hosts.get(name=name).variable_data
+        return json.loads(variable_data.data) if variable_data else {}
+
+    def test_import_ini(self):
+        source = self.write_source(TEST_INVENTORY_INI, '.ini')
+        version = self.inventory.version
+        result, stdout, stderr = self.run_command('acom_import_inventory',
+                                                  inventory_id=self.inventory.pk,
+                                                  source=source)
+        self.assertEqual(result, None)
+        self.assertTrue('hosts created' in stdout)
+        self.assertEqual(set(self.inventory.hosts.values_list('name', flat=True)),
+                         set(['lb.example.com', 'web01.example.com',
+                              'web02.example.com', 'web03.example.com',
+                              'db.example.com']))
+        self.assertEqual(self.get_host_vars('web02.example.com'),
+                         {'http_port': '8080'})
+        self.assertEqual(self.get_host_vars('db.example.com'),
+                         {'ansible_ssh_port': 5432})
+        self.assertEqual(self.get_host_vars('lb.example.com'), {})
+        servers = self.inventory.groups.get(name='servers')
+        self.assertEqual(set(servers.children.values_list('name', flat=True)),
+                         set(['web', 'db']))
+        self.assertEqual(servers.all_hosts().count(), 4)
+        web = self.inventory.groups.get(name='web')
+        self.assertEqual(json.loads(web.variable_data.data),
+                         {'ntp_server': 'ntp.example.com'})
+        inventory = Inventory.objects.get(pk=self.inventory.pk)
+        self.assertTrue(inventory.version > version)
+        # Importing the same file again changes nothing.
+        result, stdout, stderr = self.run_command('acom_import_inventory',
+                                                  inventory_id=self.inventory.pk,
+                                                  source=source)
+        self.assertEqual(result, None)
+        self.assertEqual(self.inventory.hosts.count(), 5)
+        self.assertEqual(Group.hosts.through.objects.filter(group__inventory=self.inventory).count(), 5)
+        self.assertEqual(GroupClosure.objects.filter(ancestor=servers).count(), 3)
+        # Errors in the source are reported.
+        source = self.write_source('[web\nfoo\n', '.ini')
+        result, stdout, stderr = self.run_command('acom_import_inventory',
+                                                  inventory_id=self.inventory.pk,
+                                                  source=source)
+        self.assertTrue(isinstance(result, CommandError))
+
+    def test_import_script(self):
+        source = self.write_source(TEST_INVENTORY_INI, '.ini')
+        self.run_command('acom_import_inventory', inventory_id=self.inventory.pk,
+                         source=source)
+        source = self.write_source(TEST_INVENTORY_SCRIPT, '.py', executable=True)
+        result, stdout, stderr = self.run_command('acom_import_inventory',
+                                                  inventory_id=self.inventory.pk,
+                                                  source=source)
+        self.assertEqual(result, None)
+        self.assertEqual(self.inventory.hosts.count(), 6)
+        self.assertEqual(self.get_host_vars('web04.example.com'), {'http_port': 80})
+        # Variables are merged unless asked to overwrite them.
+        self.assertEqual(self.get_host_vars('web01.example.com'), {'http_port': '8080'})
+        dc = self.inventory.groups.get(name='dc')
+        self.assertEqual(dc.all_hosts().count(), 6)
+        script_data = self.inventory.get_script_data()
+        self.assertEqual(script_data['dc']['vars'], {'region': 'east'})
+        self.assertEqual(set(script_data['web']['hosts']),
+                         set(['web%02d.example.com' % x for x in xrange(1, 5)] + ['db.example.com']))
+
+    def test_import_yaml(self):
+        source = self.write_source('''
+- host: lb.example.com
+  vars:
+  - http_port: 80
+- group: web
+  hosts:
+  - web01.example.com
+  - host: web02.example.com
+    vars: {http_port: 8080}
+  vars:
+    ntp_server: ntp.example.com
+''', '.yml')
+        result, stdout, stderr = self.run_command('acom_import_inventory',
+                                                  inventory_id=self.inventory.pk,
+                                                  source=source,
+                                                  overwrite_vars=True)
+        self.assertEqual(result, None)
+        self.assertEqual(self.inventory.hosts.count(), 4)
+        self.assertEqual(self.get_host_vars('lb.example.com'), {'http_port': 80})
+        self.assertEqual(self.get_host_vars('web02.example.com'), {'http_port': 8080})
+        web = self.inventory.groups.get(name='web')
+        self.assertEqual(web.hosts.count(), 2)
+        result, stdout, stderr = self.run_command('acom_import_inventory',
+                                                  inventory_id=self.inventory.pk)
+        self.assertTrue(isinstance(result, CommandError))
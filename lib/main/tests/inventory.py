@@ -16,8 +16,11 @@
 
 import datetime
 import json
+import logging
 
 from django.contrib.auth.models import User as DjangoUser
+from django.db import connection
+from django.test.utils import override_settings
 import django.test
 from django.test.client import Client
 from lib.main.models import *
@@ -437,3 +440,382 @@ class InventoryTest(BaseTest):
 
        
 
+
+    def test_group_all_children_and_all_hosts(self):
+        inventory = self.inventory_a
+        groups = dict((name, inventory.groups.create(name=name, inventory=inventory))
+                      for name in ('web', 'east', 'west', 'east-web', 'west-web'))
+        hosts = dict((name, inventory.hosts.create(name=name, inventory=inventory))
+                     for name in ('e1', 'w1', 'x1'))
+        # Diamond: web -> east/west -> east-web, west-web both contain e1/w1.
+        groups['east'].parents.add(groups['web'])
+        groups['web'].children.add(groups['west'])
+        groups['east-web'].parents.add(groups['east'])
+        groups['west-web'].parents.add(groups['west'])
+        groups['west-web'].parents.add(groups['east'])
+        groups['east-web'].hosts.add(hosts['e1'])
+        groups['west-web'].hosts.add(hosts['e1'], hosts['w1'])
+        names = lambda qs: set(qs.values_list('name', flat=True))
+        with self.assertNumQueries(1):
+            self.assertEqual(names(groups['web'].all_children()),
+                             set(['east', 'west', 'east-web', 'west-web']))
+        with self.assertNumQueries(1):
+            self.assertEqual(names(groups['web'].all_hosts()), set(['e1', 'w1']))
+        self.assertEqual(names(groups['west'].all_hosts()), set(['e1', 'w1']))
+        self.assertEqual(names(groups['east-web'].all_children()), set())
+        # Removing one path keeps descendants still reachable another way.
+        groups['west-web'].parents.remove(groups['west'])
+        self.assertEqual(names(groups['west'].all_hosts()), set())
+        self.assertEqual(names(groups['web'].all_hosts()), set(['e1', 'w1']))
+        groups['east'].children.clear()
+        self.assertEqual(names(groups['web'].all_children()), set(['east', 'west']))
+        self.assertEqual(names(groups['web'].all_hosts()), set())
+        # A cycle doesn't cause the lookup to loop forever.
+        groups['east'].children.add(groups['east-web'])
+        groups['web'].parents.add(groups['east-web'])
+        self.assertEqual(names(groups['east-web'].all_children()),
+                         set(['web', 'east', 'west']))
+        self.assertEqual(names(groups['west'].all_hosts()), set())
+        self.assertEqual(names(groups['east'].all_hosts()), set(['e1']))
+        # Deleting a group removes the paths through it.
+        groups['east-web'].delete()
+        self.assertEqual(names(groups['east'].all_children()), set())
+        self.assertEqual(GroupClosure.objects.filter(ancestor__inventory=inventory).count(), 6)
+
+    def test_readable_inventory_pks(self):
+        # normal user is an admin of the organization for inventory a, other
+        # user has a read permission on inventory b.
+        self.assertEqual(Inventory.get_readable_pks(self.normal_django_user),
+                         set([self.inventory_a.pk]))
+        other = User.objects.get(pk=self.other_django_user.pk)
+        with self.assertNumQueries(2):
+            self.assertEqual(Inventory.get_readable_pks(other),
+                             set([self.inventory_b.pk]))
+        # Computed only once for the same user object (i.e. per request).
+        with self.assertNumQueries(0):
+            Inventory.get_readable_pks(other)
+        self.assertEqual(Inventory.get_readable_pks(self.nobody_django_user), set())
+        # Team permissions also allow reading.
+        team = Team.objects.create(name='readers', organization=self.organizations[0])
+        team.users.add(self.nobody_django_user)
+        Permission.objects.create(inventory=self.inventory_a, team=team,
+                                  permission_type=PERM_INVENTORY_READ)
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        self.assertEqual(Inventory.get_readable_pks(nobody), set([self.inventory_a.pk]))
+        # List views only include objects from readable inventories.
+        self.inventory_a.hosts.create(name='host-a', inventory=self.inventory_a)
+        self.inventory_b.hosts.create(name='host-b', inventory=self.inventory_b)
+        self.inventory_b.groups.create(name='group-b', inventory=self.inventory_b)
+        data = self.get('/api/v1/hosts/', expect=200, auth=self.get_nobody_credentials())
+        self.assertEqual([r['name'] for r in data['results']], ['host-a'])
+        data = self.get('/api/v1/groups/', expect=200, auth=self.get_other_credentials())
+        self.assertEqual([r['name'] for r in data['results']], ['group-b'])
+        data = self.get('/api/v1/inventories/', expect=200, auth=self.get_other_credentials())
+        self.assertEqual([r['name'] for r in data['results']], ['inventory-b'])
+
+    def test_access_decisions_cached(self):
+        inventory = self.inventory_a
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        self.assertFalse(Inventory.can_user_read(nobody, inventory))
+        # Same decision isn't checked again for the same request.
+        with self.assertNumQueries(0):
+            self.assertFalse(Inventory.can_user_read(nobody, inventory))
+        # Without a shared cache timeout, the next request checks again.
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        with self.assertNumQueries(3):
+            self.assertFalse(Inventory.can_user_read(nobody, inventory))
+
+    @override_settings(ACCESS_CACHE_TIMEOUT=60)
+    def test_access_decisions_shared_between_requests(self):
+        inventory = self.inventory_a
+        self.assertFalse(Inventory.can_user_read(self.nobody_django_user, inventory))
+        self.assertEqual(Inventory.get_readable_pks(self.nobody_django_user), set())
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(Inventory.can_user_read(nobody, inventory))
+            self.assertEqual(Inventory.get_readable_pks(nobody), set())
+        # Granting a permission invalidates cached decisions.
+        Permission.objects.create(inventory=inventory, user=self.nobody_django_user,
+                                  permission_type=PERM_INVENTORY_READ)
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        self.assertTrue(Inventory.can_user_read(nobody, inventory))
+        self.assertEqual(Inventory.get_readable_pks(nobody), set([inventory.pk]))
+        self.get('/api/v1/inventories/%d/' % inventory.pk, expect=200,
+                 auth=self.get_nobody_credentials())
+        # So does a change to organization admins.
+        self.organizations[0].admins.remove(self.normal_django_user)
+        normal = User.objects.get(pk=self.normal_django_user.pk)
+        self.assertEqual(Inventory.get_readable_pks(normal), set())
+        self.get('/api/v1/inventories/%d/' % inventory.pk, expect=403,
+                 auth=self.get_normal_credentials())
+        # And moving a host to another inventory, but not other changes.
+        host = self.inventory_b.hosts.create(name='host-b', inventory=self.inventory_b)
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        self.assertFalse(Host.can_user_read(nobody, host))
+        host.description = 'moved'
+        host.save()
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(Host.can_user_read(nobody, host))
+        host.inventory = inventory
+        host.save()
+        nobody = User.objects.get(pk=self.nobody_django_user.pk)
+        self.assertTrue(Host.can_user_read(nobody, host))
+        # Decisions about request data aren't remembered.
+        group = inventory.groups.create(name='group-a', inventory=inventory)
+        self.assertFalse(Group.can_user_administrate(nobody, group, {'name': 'x'}))
+        with self.assertNumQueries(3):
+            self.assertFalse(Group.can_user_administrate(nobody, group, {'name': 'y'}))
+
+    def _count_queries(self, func, *args, **kwargs):
+        # The test client resets connection.queries when each request starts,
+        # so only queries made while handling the request are counted.
+        connection.use_debug_cursor = True
+        try:
+            func(*args, **kwargs)
+            return len(connection.queries)
+        finally:
+            connection.use_debug_cursor = False
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        inventory = self.inventory_a
+        def add_objects(n):
+            for x in xrange(n):
+                host = inventory.hosts.create(name='host-%d' % x, inventory=inventory,
+                                              created_by=self.normal_django_user)
+                group = inventory.groups.create(name='group-%d' % x, inventory=inventory,
+                                                created_by=self.normal_django_user)
+        add_objects(2)
+        urls = ('/api/v1/hosts/', '/api/v1/groups/', '/api/v1/inventories/%d/hosts/' % inventory.pk)
+        counts = {}
+        for url in urls:
+            counts[url] = self._count_queries(self.get, url, expect=200,
+                                              auth=self.get_normal_credentials())
+        Host.objects.all().delete()
+        Group.objects.all().delete()
+        add_objects(20)
+        for url in urls:
+            data = self.get(url, expect=200, auth=self.get_normal_credentials())
+            self.assertEqual(data['count'], 20)
+            self.assertEqual(data['results'][0]['related']['inventory'],
+                             '/api/v1/inventories/%d/' % inventory.pk)
+            self.assertTrue('created_by' in data['results'][0]['related'])
+            self.assertEqual(self._count_queries(self.get, url, expect=200,
+                                                 auth=self.get_normal_credentials()),
+                             counts[url])
+
+
+    def test_cursor_pagination(self):
+        inventory = self.inventory_a
+        for x in xrange(12):
+            inventory.hosts.create(name='host-%02d' % ((x * 5) % 12), inventory=inventory,
+                                   created_by=self.normal_django_user)
+        expected = list(Host.objects.filter(inventory=inventory).order_by('-name'))
+
+        # follow next links through all pages, then previous links back.
+        url = '/api/v1/hosts/?inventory=%d&order_by=-name&page_size=5&cursor=' % inventory.pk
+        pages = []
+        while url:
+            data = self.get(url, expect=200, auth=self.get_normal_credentials())
+            self.assertEqual(data['count'], 12)
+            pages.append([r['id'] for r in data['results']])
+            url = data['next']
+        self.assertEqual([len(p) for p in pages], [5, 5, 2])
+        self.assertEqual(sum(pages, []), [h.pk for h in expected])
+        url = data['previous']
+        self.assertTrue(url)
+        data = self.get(url, expect=200, auth=self.get_normal_credentials())
+        self.assertEqual([r['id'] for r in data['results']], pages[1])
+        data = self.get(data['previous'], expect=200, auth=self.get_normal_credentials())
+        self.assertEqual([r['id'] for r in data['results']], pages[0])
+        self.assertEqual(data['previous'], None)
+
+        # counting can be skipped; bad cursors or orderings are rejected.
+        data = self.get('/api/v1/hosts/?cursor=&skip_count=1', expect=200,
+                        auth=self.get_normal_credentials())
+        self.assertEqual(data['count'], None)
+        self.get('/api/v1/hosts/?cursor=foo', expect=400, auth=self.get_normal_credentials())
+        self.get('/api/v1/hosts/?cursor=&order_by=inventory', expect=400,
+                 auth=self.get_normal_credentials())
+
+    def test_filters(self):
+        inventory = self.inventory_a
+        for x in xrange(3):
+            host = inventory.hosts.create(name='web-%d' % x, inventory=inventory,
+                                          created_by=self.normal_django_user)
+        inventory.hosts.create(name='db-0', inventory=inventory,
+                               created_by=self.normal_django_user)
+        group = inventory.groups.create(name='webservers', inventory=inventory,
+                                        created_by=self.normal_django_user)
+        group.hosts.add(host)
+        url = '/api/v1/hosts/'
+        auth = self.get_normal_credentials()
+        data = self.get(url + '?name__istartswith=WEB&order_by=-name', expect=200, auth=auth)
+        self.assertEqual([r['name'] for r in data['results']], ['web-2', 'web-1', 'web-0'])
+        data = self.get(url + '?inventory=%d&name__icontains=b-' % inventory.pk, expect=200, auth=auth)
+        self.assertEqual(data['count'], 4)
+        data = self.get(url + '?groups__in=%d,0' % group.pk, expect=200, auth=auth)
+        self.assertEqual([r['name'] for r in data['results']], ['web-2'])
+
+        # fields, lookups and orderings that aren't declared by the view, or
+        # too many expensive filters at once, are rejected.
+        self.get(url + '?description=foo', expect=400, auth=auth)
+        self.get(url + '?inventory__name=foo', expect=400, auth=auth)
+        self.get(url + '?name__endswith=-0', expect=400, auth=auth)
+        self.get(url + '?order_by=variable_data__data', expect=400, auth=auth)
+        self.get(url + '?name__icontains=web&groups=%d' % group.pk, expect=400, auth=auth)
+
+        # parameters which aren't filters are accepted, and detail views
+        # ignore query parameters.
+        data = self.get(url + '?format=json&page=1&page_size=2&fields=id&name=web-0',
+                        expect=200, auth=auth)
+        self.assertEqual(data['count'], 1)
+        self.get('/api/v1/hosts/%d/?name=foo&_=1234' % host.pk, expect=200, auth=auth)
+        # list views without filter_fields reject filters instead of ignoring
+        # them.
+        audit_url = '/api/v1/organizations/%d/audit_trail/' % self.organizations[0].pk
+        self.get(audit_url + '?foo=bar', expect=400, auth=auth)
+        self.get(audit_url + '?page_size=5', expect=200, auth=auth)
+
+        # slow filters are logged.
+        records = []
+        class Handler(logging.Handler):
+            def emit(self, record):
+                records.append(record.getMessage())
+        handler = Handler()
+        logging.getLogger('lib.main.custom_filters').addHandler(handler)
+        try:
+            with override_settings(API_SLOW_FILTER_THRESHOLD=0.001):
+                self.get(url + '?name__startswith=web', expect=200, auth=auth)
+                self.get(url, expect=200, auth=auth)
+        finally:
+            logging.getLogger('lib.main.custom_filters').removeHandler(handler)
+        self.assertEqual(len(records), 1)
+        self.assertTrue('HostsList' in records[0] and 'name__startswith' in records[0])
+
+    def test_sparse_fields(self):
+        inventory = self.inventory_a
+        for x in xrange(3):
+            inventory.hosts.create(name='host-%d' % x, inventory=inventory,
+                                   created_by=self.normal_django_user)
+        auth = self.get_normal_credentials()
+        data = self.get('/api/v1/hosts/?fields=id,name', expect=200, auth=auth)
+        self.assertEqual(data['count'], 3)
+        for result in data['results']:
+            self.assertEqual(sorted(result.keys()), ['id', 'name'])
+        data = self.get('/api/v1/hosts/?related=0&cursor=', expect=200, auth=auth)
+        self.assertEqual(len(data['results']), 3)
+        for result in data['results']:
+            self.assertFalse('related' in result)
+            self.assertTrue('url' in result)
+        data = self.get('/api/v1/inventories/%d/?fields=name,related&related=0' % inventory.pk,
+                        expect=200, auth=auth)
+        self.assertEqual(data, {'name': inventory.name})
+
+    def test_conditional_get(self):
+        inventory = self.inventory_a
+        host = inventory.hosts.create(name='host-0', inventory=inventory,
+                                      created_by=self.normal_django_user)
+        group = inventory.groups.create(name='group-0', inventory=inventory,
+                                        created_by=self.normal_django_user)
+        client = Client()
+        client.login(username='normal', password='normal')
+        def get(url, expect, **headers):
+            response = client.get(url, **headers)
+            self.assertEqual(response.status_code, expect)
+            return response
+
+        # detail views answer with 304 until the object changes.
+        url = '/api/v1/hosts/%d/' % host.pk
+        response = get(url, 200)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(get(url, 304, HTTP_IF_NONE_MATCH=etag).content, '')
+        get(url, 304, HTTP_IF_MODIFIED_SINCE=last_modified)
+        get(url + '?fields=id', 200, HTTP_IF_NONE_MATCH=etag)
+        host.description = 'changed'
+        host.save()
+        get(url, 200, HTTP_IF_NONE_MATCH=etag)
+
+        # lists of hosts and groups in an inventory answer with 304 until
+        # objects are added, changed or removed, including related objects of
+        # a parent.
+        def deactivate(obj):
+            obj.active = False
+            obj.save()
+        other_host = inventory.hosts.create(name='host-2', inventory=inventory)
+        for url, change in (
+            ('/api/v1/inventories/%d/hosts/' % inventory.pk, lambda: deactivate(other_host)),
+            ('/api/v1/groups/%d/hosts/' % group.pk, lambda: group.hosts.add(host)),
+            ('/api/v1/groups/%d/hosts/' % group.pk, lambda: group.hosts.remove(host)),
+            ('/api/v1/inventories/%d/groups/' % inventory.pk,
+             lambda: inventory.groups.create(name='group-1', inventory=inventory)),
+        ):
+            etag = get(url, 200)['ETag']
+            get(url, 304, HTTP_IF_NONE_MATCH=etag)
+            change()
+            get(url, 200, HTTP_IF_NONE_MATCH=etag)
+        # other lists have no stored version, and no ETag.
+        self.assertFalse(get('/api/v1/hosts/', 200).has_header('ETag'))
+
+        # lists have no Last-Modified, and If-Modified-Since isn't honoured
+        # for them: a list that shrinks keeps its latest modification time.
+        url = '/api/v1/inventories/%d/hosts/' % inventory.pk
+        inventory.hosts.create(name='host-1', inventory=inventory)
+        response = get(url, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        Host.objects.filter(inventory=inventory, name='host-1').delete()
+        get(url, 200, HTTP_IF_MODIFIED_SINCE=last_modified)
+        get(url, 200, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        response = get(url, 200, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(json.loads(response.content)['count'], 1)
+
+    def test_bulk_post(self):
+        inventory = self.inventory_a
+        hosts = [inventory.hosts.create(name='host-%02d' % x, inventory=inventory)
+                 for x in xrange(20)]
+        group = inventory.groups.create(name='group-0', inventory=inventory)
+        other_host = self.inventory_b.hosts.create(name='host-b', inventory=self.inventory_b)
+        group.hosts.add(hosts[0])
+        url = '/api/v1/groups/%d/hosts/' % group.pk
+        data = [dict(id=h.pk) for h in hosts] + [dict(id=hosts[1].pk),
+                                                 dict(id=99999),
+                                                 dict(id=other_host.pk),
+                                                 dict(name='new-host')]
+
+        # the parent is checked once for the whole request.
+        self.post(url, data=data, expect=403, auth=self.get_nobody_credentials())
+        self.post(url, data=data, expect=403, auth=self.get_other_credentials())
+
+        results = self.post(url, data=data, expect=200,
+                            auth=self.get_normal_credentials())['results']
+        self.assertEqual([r['status'] for r in results],
+                         [409] + [204] * 19 + [409, 404, 403, 201])
+        self.assertEqual(results[1]['id'], hosts[1].pk)
+        self.assertEqual(group.hosts.count(), 21)
+        self.assertTrue(group.hosts.filter(name='new-host').exists())
+        self.assertEqual(inventory.hosts.filter(name='new-host').count(), 1)
+
+        # the number of queries doesn't depend on the number of items.
+        counts = [self._count_queries(self.post, url, expect=200,
+                                      data=[dict(id=h.pk, disassociate=1) for h in hosts[x:y]],
+                                      auth=self.get_normal_credentials())
+                  for x, y in ((0, 2), (2, 10))]
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(group.hosts.count(), 11)
+
+        # groups can be created below an inventory and attached as children.
+        url = '/api/v1/inventories/%d/groups/' % inventory.pk
+        results = self.post(url, data=[dict(name='child-%d' % x) for x in xrange(3)] + [{}],
+                            expect=200, auth=self.get_normal_credentials())['results']
+        self.assertEqual([r['status'] for r in results], [201, 201, 201, 400])
+        url = '/api/v1/groups/%d/children/' % group.pk
+        data = [dict(id=r['id']) for r in results[:3]] + [dict(id=group.pk)]
+        results = self.post(url, data=data, expect=200,
+                            auth=self.get_normal_credentials())['results']
+        self.assertEqual([r['status'] for r in results], [204, 204, 204, 400])
+        self.assertEqual(group.all_children().count(), 3)
+
+        # lists without bulk posts reject them.
+        self.post('/api/v1/organizations/%d/users/' % self.organizations[0].pk,
+                  data=[dict(id=1)], expect=400, auth=self.get_super_credentials())
@@ -16,8 +16,12 @@
 
 import datetime
 import json
+import os
+import tempfile
+import time
 
 from django.contrib.auth.models import User as DjangoUser
+from django.db import connection
 import django.test
 from django.test.client import Client
 from lib.main.models import *
@@ -191,3 +195,285 @@ class JobsTest(BaseTest):
         # that we can drill all the way down and can get at host failure lists, etc ...
 
 
+
+    def test_job_stdout(self):
+        job = self.template1.create_job(created_by=self.normal_django_user)
+        url = '/api/v1/jobs/%d/stdout/' % job.pk
+        h, job.result_stdout_file = tempfile.mkstemp(suffix='.out')
+        self._temp_files.append(job.result_stdout_file)
+        f = os.fdopen(h, 'wb')
+        f.write('PLAY [all] ***\nTASK: [ping] ***\n')
+        f.close()
+        job.save()
+        self.assertEqual(job.result_stdout_size, 32)
+        self.assertEqual(job.result_stdout, 'PLAY [all] ***\nTASK: [ping] ***\n')
+
+        # read the whole output, then just part of it, then the tail.
+        self.get(url, expect=401)
+        self.get(url, expect=403, auth=self.get_nobody_credentials())
+        self.get(url, expect=403, auth=self.get_other_credentials())
+        data = self.get(url, expect=200, auth=self.get_normal_credentials())
+        self.assertEqual(data['content'], 'PLAY [all] ***\nTASK: [ping] ***\n')
+        self.assertEqual((data['start'], data['end'], data['size']), (0, 32, 32))
+        data = self.get(url + '?start=5&end=9', expect=200, auth=self.get_normal_credentials())
+        self.assertEqual(data['content'], '[all')
+        self.assertEqual((data['start'], data['end']), (5, 9))
+        data = self.get(url + '?start=-17', expect=200, auth=self.get_super_credentials())
+        self.assertEqual(data['content'], 'TASK: [ping] ***\n')
+        self.assertEqual((data['start'], data['end']), (15, 32))
+
+        # more output is appended while the job runs, client reads only new bytes.
+        f = open(job.result_stdout_file, 'ab')
+        f.write('ok: [127.0.0.1]\n')
+        f.close()
+        data = self.get(url + '?start=%d' % data['end'], expect=200, auth=self.get_super_credentials())
+        self.assertEqual(data['content'], 'ok: [127.0.0.1]\n')
+        self.assertEqual((data['start'], data['end'], data['size']), (32, 48, 48))
+        self.get(url + '?start=foo', expect=400, auth=self.get_super_credentials())
+
+        # jobs run before output was written to a file still have their output in the database.
+        job.result_stdout_file = ''
+        job.result_stdout_text = 'old output'
+        job.save()
+        data = self.get(url + '?start=3', expect=200, auth=self.get_super_credentials())
+        self.assertEqual(data['content'], ' output')
+
+    def test_host_summary_from_stats(self):
+        job = self.template1.create_job(created_by=self.normal_django_user)
+        hosts = [self.host_a, self.host_b] + [
+            Host.objects.create(name='host-%02d' % x, inventory=self.inventory)
+            for x in xrange(20)]
+        names = [h.name for h in hosts]
+        def stats(failed=()):
+            return {
+                'ok': dict((name, 3) for name in names + ['unknown']),
+                'changed': dict((name, 1) for name in names[::2]),
+                'failures': dict((name, 1) for name in failed),
+                'dark': {},
+                'skipped': {},
+                'processed': dict((name, 1) for name in names),
+            }
+        def save_stats(**kwargs):
+            connection.use_debug_cursor = True
+            del connection.queries[:]
+            try:
+                job.job_events.create(event='playbook_on_stats',
+                                      event_data=stats(**kwargs))
+                return len(connection.queries)
+            finally:
+                connection.use_debug_cursor = False
+
+        queries = save_stats()
+        self.assertTrue(queries < 15, queries)
+        self.assertEqual(job.job_host_summaries.count(), 22)
+        self.assertEqual(job.job_host_summaries.filter(ok=3).count(), 22)
+        self.assertEqual(job.job_host_summaries.filter(changed=1).count(), 11)
+        self.assertEqual(set(job.changed_hosts), set(hosts[::2]))
+        self.assertTrue(Job.objects.get(pk=job.pk).host_summary_time > 0)
+
+        # summaries are updated in place if stats are received again.
+        pks = set(job.job_host_summaries.values_list('pk', flat=True))
+        queries = save_stats(failed=names[:3])
+        self.assertTrue(queries < 15, queries)
+        self.assertEqual(set(job.job_host_summaries.values_list('pk', flat=True)), pks)
+        self.assertEqual(set(job.failed_hosts), set(hosts[:3]))
+        self.assertEqual(job.job_host_summaries.filter(ok=3).count(), 22)
+        job = Job.objects.get(pk=job.pk)
+        self.assertEqual((job.hosts_ok, job.hosts_failed, job.hosts_changed,
+                          job.hosts_dark, job.hosts_skipped), (22, 3, 11, 0, 0))
+
+        # stats that aren't dicts leave the existing values alone.
+        event_data = stats()
+        event_data['failures'] = 'bogus'
+        event_data['ok'] = dict((name, 4) for name in names)
+        job.job_events.create(event='playbook_on_stats', event_data=event_data)
+        self.assertEqual(set(job.failed_hosts), set(hosts[:3]))
+        self.assertEqual(job.job_host_summaries.filter(ok=4).count(), 22)
+        self.assertTrue(Host.objects.get(pk=hosts[0].pk).has_active_failures)
+
+    def test_host_last_job(self):
+        jobs = [self.template1.create_job(created_by=self.normal_django_user)
+                for x in xrange(2)]
+        def save_stats(job, failures):
+            job.job_events.create(event='playbook_on_stats', event_data={
+                'ok': {self.host_a.name: 1, self.host_b.name: 1},
+                'failures': failures,
+            })
+        client = Client()
+        client.login(username='normal', password='normal')
+        inventory_url = '/api/v1/inventories/%d/' % self.inventory.pk
+        etag = client.get(inventory_url)['ETag']
+        self.assertEqual(client.get(inventory_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        hosts_etag = client.get(inventory_url + 'hosts/')['ETag']
+        save_stats(jobs[1], {self.host_b.name: 1})
+        # hosts in the inventory now have a last job.
+        response = client.get(inventory_url + 'hosts/', HTTP_IF_NONE_MATCH=hosts_etag)
+        self.assertEqual(response.status_code, 200)
+        # the inventory counts hosts with failures, so it has changed.
+        response = client.get(inventory_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['hosts_with_active_failures'], 1)
+        host_a = Host.objects.get(pk=self.host_a.pk)
+        host_b = Host.objects.get(pk=self.host_b.pk)
+        self.assertEqual(host_a.last_job, jobs[1])
+        self.assertEqual(host_a.last_job_host_summary.job, jobs[1])
+        self.assertEqual(host_b.last_job_host_summary.failures, 1)
+        self.assertFalse(host_a.has_active_failures)
+        self.assertTrue(host_b.has_active_failures)
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.pk).hosts_with_active_failures, 1)
+
+        # stats of an older job don't replace those of the last job.
+        save_stats(jobs[0], {self.host_a.name: 1})
+        self.assertEqual(Host.objects.get(pk=self.host_a.pk).last_job, jobs[1])
+        self.assertEqual(Host.objects.get(pk=self.host_a.pk).last_job_host_summary,
+                         host_a.last_job_host_summary)
+        # stats received again for the last job update hosts in place.
+        save_stats(jobs[1], {self.host_a.name: 1, self.host_b.name: 1})
+        host_a = Host.objects.get(pk=self.host_a.pk)
+        self.assertTrue(host_a.has_active_failures)
+        self.assertEqual(host_a.last_job_host_summary.job, jobs[1])
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.pk).hosts_with_active_failures, 2)
+        save_stats(jobs[1], {self.host_b.name: 1})
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.pk).hosts_with_active_failures, 1)
+
+        url = '/api/v1/inventories/%d/hosts/?has_active_failures=true' % self.inventory.pk
+        data = self.get(url, expect=200, auth=self.get_normal_credentials())
+        self.assertEqual([h['id'] for h in data['results']], [self.host_b.pk])
+        self.assertEqual(data['results'][0]['last_job'], jobs[1].pk)
+        data = self.get('/api/v1/hosts/?has_active_failures=0', expect=200,
+                        auth=self.get_normal_credentials())
+        self.assertEqual([h['id'] for h in data['results']], [self.host_a.pk])
+        data = self.get('/api/v1/inventories/%d/' % self.inventory.pk, expect=200,
+                        auth=self.get_normal_credentials())
+        self.assertEqual(data['hosts_with_active_failures'], 1)
+
+        # failed hosts that are removed aren't counted anymore.
+        host_b.active = False
+        host_b.save()
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.pk).hosts_with_active_failures, 0)
+
+    def test_jobs_summary(self):
+        jobs = [self.template1.create_job(created_by=self.normal_django_user)
+                for x in xrange(4)]
+        # readable through the project's organization
+        jobs.append(self.template1.create_job(created_by=self.super_django_user))
+        jobs[0].job_events.create(event='playbook_on_stats', event_data={
+            'ok': {self.host_a.name: 2, self.host_b.name: 1},
+            'failures': {self.host_b.name: 1},
+        })
+        url = '/api/v1/jobs/summary/'
+        self.get(url, expect=401)
+        data = self.get(url, expect=200, auth=self.get_nobody_credentials())
+        self.assertEqual(data['results'], [])
+        connection.use_debug_cursor = True
+        try:
+            data = self.get(url, expect=200, auth=self.get_normal_credentials())
+            # session and user lookups, readable projects, then the jobs.
+            self.assertEqual(len(connection.queries), 5)
+        finally:
+            connection.use_debug_cursor = False
+        self.assertEqual([j['id'] for j in data['results']],
+                         [j.pk for j in reversed(jobs)])
+        self.assertEqual(data['results'][-1]['hosts_ok'], 2)
+        self.assertEqual(data['results'][-1]['hosts_failed'], 1)
+        data = self.get(url + '?page_size=2', expect=200, auth=self.get_super_credentials())
+        self.assertEqual(len(data['results']), 2)
+        data = self.get(url + '?ids=%d,%d' % (jobs[0].pk, jobs[2].pk), expect=200,
+                        auth=self.get_normal_credentials())
+        self.assertEqual([j['id'] for j in data['results']], [jobs[2].pk, jobs[0].pk])
+        self.get(url + '?ids=foo', expect=400, auth=self.get_normal_credentials())
+
+    def test_job_events_tail(self):
+        job = self.template1.create_job(created_by=self.normal_django_user)
+        job.status = 'running'
+        job.save()
+        url = '/api/v1/jobs/%d/job_events/tail/' % job.pk
+        self.get(url, expect=401)
+        self.get(url, expect=403, auth=self.get_nobody_credentials())
+        events = [job.job_events.create(event='runner_on_ok',
+                                        event_data={'host': self.host_a.name})
+                  for x in xrange(3)]
+        data = self.get(url + '?page_size=2', expect=200,
+                        auth=self.get_normal_credentials())
+        self.assertEqual([e['id'] for e in data['results']],
+                         [e.pk for e in events[:2]])
+        self.assertEqual(data['results'][0]['host'], self.host_a.pk)
+        self.assertEqual(data['last_id'], events[1].pk)
+        self.assertTrue(data['more'])
+        data = self.get(url + '?since_id=%d' % data['last_id'], expect=200,
+                        auth=self.get_normal_credentials())
+        self.assertEqual([e['id'] for e in data['results']], [events[2].pk])
+        self.assertFalse(data['more'])
+        # Nothing new: wait for the timeout, then return the same cursor.
+        # Overriding CACHES only makes is_cache_shared() report a shared
+        # cache; the cache used stays the local memory one, so this tests the
+        # waiting itself, not noticing events written by another process.
+        shared_caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        }}
+        with self.settings(JOB_EVENT_TAIL_POLL_INTERVAL=10, CACHES=shared_caches):
+            start = time.time()
+            data = self.get(url + '?since_id=%d&timeout=0.2' % events[2].pk,
+                            expect=200, auth=self.get_normal_credentials())
+            self.assertTrue(time.time() - start >= 0.2)
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['last_id'], events[2].pk)
+        # Without a shared cache new events can't be noticed, so don't wait.
+        start = time.time()
+        data = self.get(url + '?since_id=%d&timeout=30' % events[2].pk,
+                        expect=200, auth=self.get_normal_credentials())
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(data['results'], [])
+        self.get(url + '?since_id=foo', expect=400,
+                 auth=self.get_normal_credentials())
+        for timeout in ('nan', 'inf', '-inf'):
+            self.get(url + '?timeout=%s' % timeout, expect=400,
+                     auth=self.get_normal_credentials())
+        # Writing events changes the generation waiting requests check.
+        generation = get_job_events_generation(job.pk)
+        job.job_events.create(event='runner_on_ok')
+        self.assertNotEqual(get_job_events_generation(job.pk), generation)
+        # Finished jobs are returned right away, without waiting.
+        job.status = 'successful'
+        job.save()
+        start = time.time()
+        data = self.get(url + '?since_id=%d&timeout=30' % (events[2].pk + 1),
+                        expect=200, auth=self.get_normal_credentials())
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['status'], 'successful')
+
+    def test_event_data_storage(self):
+        job = self.template1.create_job(created_by=self.normal_django_user)
+        facts = dict(('fact_%d' % x, 'value %d' % x) for x in xrange(200))
+        event_data = {'host': self.host_a.name,
+                      'res': {'changed': False, 'ansible_facts': facts}}
+        for x in xrange(3):
+            job.job_events.create(event='runner_on_ok', event_data=event_data)
+        # Facts are stored once, and the data of events compressed.
+        self.assertEqual(JobEventDocument.objects.count(), 1)
+        for data in job.job_events.values_list('event_data', flat=True):
+            self.assertTrue('__document__' in data or data.startswith('zlib:'))
+            self.assertFalse('fact_0' in data)
+        self.assertTrue(sum(map(len, job.job_events.values_list('event_data', flat=True))) <
+                        len(json.dumps(event_data)))
+        # Data is decoded only when used.
+        job_event = job.job_events.all()[0]
+        self.assertFalse('event_data' in job_event.__dict__)
+        job_event.save()
+        job_event = JobEvent.objects.get(pk=job_event.pk)
+        self.assertEqual(job_event.event_data, event_data)
+        self.assertEqual(job_event.host, self.host_a)
+        # Plain JSON can still be stored and read.
+        with self.settings(JOB_EVENT_DATA_COMPRESSION=False):
+            job_event = job.job_events.create(event='runner_on_ok',
+                                              event_data=event_data)
+        data = JobEvent.objects.filter(pk=job_event.pk).values_list('event_data', flat=True)[0]
+        self.assertEqual(json.loads(data), event_data)
+        self.assertEqual(JobEvent.objects.get(pk=job_event.pk).event_data, event_data)
+        # Strings assigned later are values, not stored text.
+        job_event.event_data = '"plain string"'
+        self.assertEqual(job_event.event_data, '"plain string"')
+        job_event.save()
+        job_event = JobEvent.objects.get(pk=job_event.pk)
+        self.assertEqual(job_event.event_data, '"plain string"')
@@ -19,8 +19,10 @@ import json
 
 from django.contrib.auth.models import User as DjangoUser
 import django.test
+from django.core.urlresolvers import reverse
 from django.test.client import Client
 from lib.main.models import *
+from lib.main.url_templates import build_url, get_url_templates
 from lib.main.tests.base import BaseTest
 
 class OrganizationsTest(BaseTest):
@@ -363,4 +365,15 @@ class OrganizationsTest(BaseTest):
         # also check that DELETE on the collection doesn't work
         self.delete(self.collection(), expect=405, auth=self.get_super_credentials())
 
+    def test_url_templates(self):
+        import lib.urls
+        templates = get_url_templates()
+        self.assertTrue(lib.urls.views_OrganizationsDetail in templates)
+        self.assertTrue(lib.urls.views_JobTemplateStart in templates)
+        for view in templates:
+            args = (42,) * templates[view][1]
+            self.assertEqual(build_url(view, *args), reverse(view, args=args))
+        self.assertEqual(self.organizations[0].get_absolute_url(),
+                         '/api/v1/organizations/%d/' % self.organizations[0].pk)
+
 # TODO: tests for tag disassociation
@@ -143,6 +143,35 @@ class ProjectsTest(BaseTest):
         project = self.projects[7]
         write_test_file(project, 'tasks/blah.yml', TEST_PLAYBOOK)
         self.assertEqual(len(project.available_playbooks), 0)
+
+        # Only new or changed files are checked again; roles and tasks
+        # folders are not searched at all.
+        project = self.projects[8]
+        write_test_file(project, 'site.yml', TEST_PLAYBOOK)
+        write_test_file(project, 'web.yml', '- include: site.yml\n')
+        write_test_file(project, 'vars/main.yml', 'foo: bar\n')
+        write_test_file(project, 'roles/web/tasks/main.yml', TEST_PLAYBOOK)
+        self.assertEqual(project.available_playbooks, ['site.yml', 'web.yml'])
+        self.assertEqual(sorted(project.playbook_files.values_list('path', flat=True)),
+                         ['site.yml', 'vars/main.yml', 'web.yml'])
+        checked = []
+        def classify_playbooks(paths, processes=1):
+            checked.extend([os.path.relpath(p, project.local_path) for p in paths])
+            return original_classify_playbooks(paths, processes)
+        import lib.main.models
+        original_classify_playbooks = lib.main.models.classify_playbooks
+        lib.main.models.classify_playbooks = classify_playbooks
+        try:
+            self.assertEqual(project.available_playbooks, ['site.yml', 'web.yml'])
+            self.assertEqual(checked, [])
+            write_test_file(project, 'web.yml', 'not: a playbook\n')
+            os.remove(os.path.join(project.local_path, 'site.yml'))
+            write_test_file(project, 'db.yml', TEST_PLAYBOOK)
+            self.assertEqual(project.available_playbooks, ['db.yml'])
+            self.assertEqual(sorted(checked), ['db.yml', 'web.yml'])
+        finally:
+            lib.main.models.classify_playbooks = original_classify_playbooks
+        self.assertEqual(project.playbook_files.count(), 3)
                 
 
     def test_mainline(self):
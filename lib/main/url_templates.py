@@ -0,0 +1,76 @@
+# Copyright (c) 2013 AnsibleWorks, Inc.
+#
+# This file is part of Ansible Commander.
+#
+# Ansible Commander is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# Ansible Commander is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Serializers build several URLs for every object they return (its url and the
+related resources).  Instead of calling reverse() for each of them, the URL
+patterns in lib.urls are turned once into string formatting templates, one per
+view, and IDs are formatted directly into them.
+'''
+
+from django.core.urlresolvers import get_resolver, get_script_prefix, reverse
+
+__all__ = ['build_url', 'get_url_templates']
+
+_url_templates = None
+
+def load_url_templates():
+    ''' build a template for each API view in lib.urls that reverse() would use '''
+
+    import lib.urls
+    resolver = get_resolver(None)
+    templates = {}
+    for name in dir(lib.urls):
+        if not name.startswith('views_'):
+            continue
+        view = getattr(lib.urls, name)
+        possibilities = resolver.reverse_dict.getlist(view)
+        # views with several patterns, optional groups or default arguments
+        # are left to reverse().
+        if len(possibilities) != 1:
+            continue
+        bits, pattern, defaults = possibilities[0]
+        if len(bits) != 1 or defaults:
+            continue
+        result, params = bits[0]
+        template = result
+        for param in params:
+            template = template.replace('%%(%s)s' % param, '%s', 1)
+        templates[view] = (str(template), len(params))
+    return templates
+
+def get_url_templates():
+    global _url_templates
+    if _url_templates is None:
+        _url_templates = load_url_templates()
+    return _url_templates
+
+def build_url(view, *args):
+    '''
+    Return the URL of a view in lib.urls for the given positional arguments,
+    same as reverse(view, args=args) for IDs.
+    '''
+
+    templates = _url_templates
+    if templates is None:
+        templates = get_url_templates()
+    try:
+        template, nargs = templates[view]
+    except KeyError:
+        return reverse(view, args=args)
+    if len(args) != nargs:
+        return reverse(view, args=args)
+    return get_script_prefix() + template % args
@@ -14,14 +14,18 @@
 # You should have received a copy of the GNU General Public License
 # along with Ansible Commander. If not, see <http://www.gnu.org/licenses/>.
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from lib.main.models import *
 from django.contrib.auth.models import User
 from lib.main.serializers import *
 from lib.main.rbac import *
+from lib.main.custom_filters import TEXT_LOOKUPS
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.db.models import Q
 from rest_framework import mixins
 from rest_framework import generics
 from rest_framework import permissions
@@ -33,6 +37,7 @@ from rest_framework.views import APIView
 import exceptions
 import datetime
 import json as python_json
+import math
 from base_views import *
 
 
@@ -562,21 +567,16 @@ class InventoryList(BaseList):
     model = Inventory
     serializer_class = InventorySerializer
     permission_classes = (CustomRbac,)
-    filter_fields = ('name',)
+    filter_fields = {
+        'name':         TEXT_LOOKUPS,
+        'organization': ('exact', 'in'),
+        'hosts_with_active_failures': ('exact', 'gt', 'gte', 'lt', 'lte'),
+    }
+    ordering_fields = ('id', 'name', 'creation_date', 'organization',
+                       'hosts_with_active_failures')
 
     def _filter_queryset(self, base):
-        if self.request.user.is_superuser:
-            return base.all()
-        admin_of  = base.filter(organization__admins__in = [ self.request.user ]).distinct()
-        has_user_perms = base.filter(
-            permissions__user__in = [ self.request.user ],
-            permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        has_team_perms = base.filter(
-            permissions__team__in = self.request.user.teams.all(),
-            permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        return admin_of | has_user_perms | has_team_perms
+        return self._filter_by_readable_inventory(base, 'pk')
 
     def _get_queryset(self):
         ''' I can see inventory when I'm a superuser, an org admin of the inventory, or I have permissions on it '''
@@ -594,7 +594,15 @@ class HostsList(BaseList):
     model = Host
     serializer_class = HostSerializer
     permission_classes = (CustomRbac,)
-    filter_fields = ('name',)
+    filter_fields = {
+        'name':                TEXT_LOOKUPS,
+        'inventory':           ('exact', 'in'),
+        'groups':              ('exact', 'in'),
+        'has_active_failures': ('exact',),
+        'last_job':            ('exact', 'in'),
+    }
+    ordering_fields = ('id', 'name', 'creation_date', 'inventory')
+    max_filter_cost = 12
 
     def _get_queryset(self):
         '''
@@ -604,18 +612,7 @@ class HostsList(BaseList):
            or when I have allowing read permissions via a user or team on an inventory they are in
         '''
         base = Host.objects
-        if self.request.user.is_superuser:
-            return base.all()
-        admin_of  = base.filter(inventory__organization__admins__in = [ self.request.user ]).distinct()
-        has_user_perms = base.filter(
-            inventory__permissions__user__in = [ self.request.user ],
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        has_team_perms = base.filter(
-            inventory__permissions__team__in = self.request.user.teams.all(),
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        return admin_of | has_user_perms | has_team_perms
+        return self._filter_by_readable_inventory(base)
 
 class HostsDetail(BaseDetail):
 
@@ -636,7 +633,11 @@ class InventoryHostsList(BaseSubList):
     # FIXME: go back and add these to other SubLists
     inject_primary_key_on_post_as = 'inventory'
     severable = False
-    filter_fields = ('name',)
+    bulk_postable = True
+    filter_fields = {
+        'name':                TEXT_LOOKUPS,
+        'has_active_failures': ('exact',),
+    }
 
     def _get_queryset(self):
         inventory = Inventory.objects.get(pk=self.kwargs['pk'])
@@ -649,7 +650,13 @@ class GroupsList(BaseList):
     model = Group
     serializer_class = GroupSerializer
     permission_classes = (CustomRbac,)
-    filter_fields = ('name',)
+    filter_fields = {
+        'name':      TEXT_LOOKUPS,
+        'inventory': ('exact', 'in'),
+        'parents':   ('exact', 'in'),
+    }
+    ordering_fields = ('id', 'name', 'creation_date', 'inventory')
+    max_filter_cost = 12
 
     def _get_queryset(self):
         '''
@@ -658,19 +665,8 @@ class GroupsList(BaseList):
            or an organization admin of an inventory they are in
            or when I have allowing read permissions via a user or team on an inventory they are in
         '''
-        base = Groups.objects
-        if self.request.user.is_superuser:
-            return base.all()
-        admin_of  = base.filter(inventory__organization__admins__in = [ self.request.user ]).distinct()
-        has_user_perms = base.filter(
-            inventory__permissions__user__in = [ self.request.user ],
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        has_team_perms = base.filter(
-            inventory__permissions__team__in = self.request.user.teams.all(),
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        return admin_of | has_user_perms | has_team_perms
+        base = Group.objects
+        return self._filter_by_readable_inventory(base)
 
 class GroupsChildrenList(BaseSubList):
 
@@ -681,29 +677,17 @@ class GroupsChildrenList(BaseSubList):
     relationship = 'children'
     postable = True
     inject_primary_key_on_post_as = 'parent'
+    bulk_postable = True
     filter_fields = ('name',)
 
     def _get_queryset(self):
 
-        # FIXME: this is the mostly the same as GroupsList, share code similar to how done with Host and Group objects.
-
         parent = Group.objects.get(pk=self.kwargs['pk'])
 
         # FIXME: verify read permissions on this object are still required at a higher level
 
         base = parent.children
-        if self.request.user.is_superuser:
-            return base.all()
-        admin_of  = base.filter(inventory__organization__admins__in = [ self.request.user ]).distinct()
-        has_user_perms = base.filter(
-            inventory__permissions__user__in = [ self.request.user ],
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        has_team_perms = base.filter(
-            inventory__permissions__team__in = self.request.user.teams.all(),
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        return admin_of | has_user_perms | has_team_perms
+        return self._filter_by_readable_inventory(base)
 
 class GroupsHostsList(BaseSubList):
     ''' the list of hosts directly below a group '''
@@ -715,6 +699,7 @@ class GroupsHostsList(BaseSubList):
     relationship = 'hosts'
     postable = True
     inject_primary_key_on_post_as = 'group'
+    bulk_postable = True
     filter_fields = ('name',)
 
     def _get_queryset(self):
@@ -724,18 +709,7 @@ class GroupsHostsList(BaseSubList):
         # FIXME: verify read permissions on this object are still required at a higher level
 
         base = parent.hosts
-        if self.request.user.is_superuser:
-            return base.all()
-        admin_of  = base.filter(inventory__organization__admins__in = [ self.request.user ]).distinct()
-        has_user_perms = base.filter(
-            inventory__permissions__user__in = [ self.request.user ],
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        has_team_perms = base.filter(
-            inventory__permissions__team__in = self.request.user.teams.all(),
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        return admin_of | has_user_perms | has_team_perms
+        return self._filter_by_readable_inventory(base)
 
 
 class GroupsAllHostsList(BaseSubList):
@@ -748,40 +722,15 @@ class GroupsAllHostsList(BaseSubList):
     relationship = 'hosts'
     filter_fields = ('name',)
 
-    def _child_hosts(self, parent):
-        # TODO: should probably be a method on the model
-        result = parent.hosts.distinct()
-        if parent.children.count() == 0:
-            return result
-        else:
-            for child in parent.children.all():
-                if child == parent:
-                    # shouldn't happen, but be prepared in case DB is weird
-                    continue
-                result = result | self._child_hosts(child)
-            return result
-
     def _get_queryset(self):
 
         parent = Group.objects.get(pk=self.kwargs['pk'])
 
         # FIXME: verify read permissions on this object are still required at a higher level
 
-        base = self._child_hosts(parent)
+        base = parent.all_hosts()
 
-        if self.request.user.is_superuser:
-            return base.all()
-
-        admin_of  = base.filter(inventory__organization__admins__in = [ self.request.user ]).distinct()
-        has_user_perms = base.filter(
-            inventory__permissions__user__in = [ self.request.user ],
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        has_team_perms = base.filter(
-            inventory__permissions__team__in = self.request.user.teams.all(),
-            inventory__permissions__permission_type__in = PERMISSION_TYPES_ALLOWING_INVENTORY_READ,
-        ).distinct()
-        return admin_of | has_user_perms | has_team_perms
+        return self._filter_by_readable_inventory(base)
 
 
 class GroupsDetail(BaseDetail):
@@ -803,6 +752,7 @@ class InventoryGroupsList(BaseSubList):
     # FIXME: go back and add these to other SubLists
     inject_primary_key_on_post_as = 'inventory'
     severable = False
+    bulk_postable = True
     filter_fields = ('name',)
 
     def _get_queryset(self):
@@ -844,7 +794,13 @@ class JobTemplatesList(BaseList):
     model = JobTemplate
     serializer_class = JobTemplateSerializer
     permission_classes = (CustomRbac,)
-    filter_fields = ('name',)
+    filter_fields = {
+        'name':      TEXT_LOOKUPS,
+        'job_type':  ('exact',),
+        'inventory': ('exact', 'in'),
+        'project':   ('exact', 'in'),
+    }
+    ordering_fields = ('id', 'name', 'creation_date')
 
     def _get_queryset(self):
         ''' 
@@ -877,6 +833,155 @@ class JobsList(BaseList):
 class JobsDetail(BaseDetail):
     pass
 
+class JobsStdout(generics.RetrieveAPIView):
+    '''
+    Read a range of bytes from the output of a job.  Pass start (negative to
+    count back from the end of the output) and optionally end as query
+    parameters; clients can follow a running job by passing the returned end
+    as the next start.
+    '''
+
+    model = Job
+    permission_classes = (CustomRbac,)
+
+    def item_permissions_check(self, request, obj):
+        return Job.can_user_read(request.user, obj)
+
+    def get_object(self, queryset=None):
+        # query parameters here are not filters, so don't pass the queryset
+        # through the filter backend.
+        try:
+            obj = Job.objects.get(pk=self.kwargs['pk'])
+        except Job.DoesNotExist:
+            raise Http404()
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        try:
+            start = int(request.QUERY_PARAMS.get('start', 0))
+            end = request.QUERY_PARAMS.get('end', None)
+            if end is not None:
+                end = int(end)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        size = job.result_stdout_size
+        if start < 0:
+            start = max(0, size + start)
+        content = job.get_result_stdout_range(start, end)
+        data = dict(
+            start   = start,
+            end     = start + len(content),
+            size    = size,
+            content = content.decode('utf-8', 'replace'),
+        )
+        return Response(data)
+
+class JobsEventsTail(generics.RetrieveAPIView):
+    '''
+    Follow the events of a job: return the events with an id greater than
+    since_id, waiting up to timeout seconds for new ones if there are none yet
+    and the job hasn't finished.  Clients pass the returned last_id as the
+    next since_id.
+    '''
+
+    model = Job
+    permission_classes = (CustomRbac,)
+    max_events = 1000
+
+    def item_permissions_check(self, request, obj):
+        return Job.can_user_read(request.user, obj)
+
+    def get_object(self, queryset=None):
+        # query parameters here are not filters, so don't pass the queryset
+        # through the filter backend.
+        try:
+            obj = Job.objects.get(pk=self.kwargs['pk'])
+        except Job.DoesNotExist:
+            raise Http404()
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        max_timeout = getattr(settings, 'JOB_EVENT_TAIL_TIMEOUT', 30)
+        try:
+            since_id = int(request.QUERY_PARAMS.get('since_id', 0))
+            timeout = float(request.QUERY_PARAMS.get('timeout', max_timeout))
+            limit = int(request.QUERY_PARAMS.get('page_size', None) or
+                        api_settings.PAGINATE_BY)
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST,
+                            data=dict(detail='since_id, timeout and page_size must be numbers'))
+        if math.isnan(timeout) or math.isinf(timeout):
+            return Response(status=status.HTTP_400_BAD_REQUEST,
+                            data=dict(detail='timeout must be a finite number'))
+        timeout = min(max(timeout, 0), max_timeout)
+        limit = min(max(limit, 1), self.max_events)
+        # Nothing is changed by this request, so its transaction is committed
+        # before waiting rather than held open (later queries then also see
+        # events committed since).
+        events = job.get_events_since(since_id, timeout, limit,
+                                      before_wait=transaction.commit)
+        results = [dict(
+            id         = event.pk,
+            created    = event.created,
+            event      = event.event,
+            event_data = event.event_data,
+            host       = event.host_id,
+        ) for event in events]
+        data = dict(
+            status  = job.status,
+            last_id = events[-1].pk if events else since_id,
+            more    = len(events) == limit,
+            results = results,
+        )
+        return Response(data)
+
+class JobsSummary(APIView):
+    '''
+    Host counts of many jobs from a single query: the most recent jobs (up to
+    page_size of them), or the jobs given as a comma separated list of ids.
+    '''
+
+    permission_classes = (CustomRbac,)
+    fields = ('id', 'name', 'status', 'hosts_ok', 'hosts_failed',
+              'hosts_changed', 'hosts_dark', 'hosts_skipped')
+    max_jobs = 500
+
+    def list_permissions_check(self, request, obj=None):
+        return request.method == 'GET'
+
+    def get_queryset(self):
+        ''' jobs the user can see, as in Job.can_user_read '''
+        user = self.request.user
+        base = Job.objects.filter(active=True)
+        if user.is_superuser:
+            return base
+        project_pks = Job.get_readable_project_pks(user)
+        if not project_pks:
+            return base.filter(created_by=user)
+        return base.filter(Q(created_by=user) | Q(project__in=project_pks))
+
+    def get(self, request, format=None):
+        try:
+            page_size = int(request.QUERY_PARAMS.get('page_size', None) or
+                            api_settings.PAGINATE_BY)
+            ids = [int(x) for x in request.QUERY_PARAMS.get('ids', '').split(',') if x.strip()]
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST,
+                            data=dict(detail='page_size and ids must be integers'))
+        if len(ids) > self.max_jobs or page_size > self.max_jobs:
+            return Response(status=status.HTTP_400_BAD_REQUEST,
+                            data=dict(detail='At most %d jobs can be requested' % self.max_jobs))
+        qs = self.get_queryset().order_by('-pk').values(*self.fields)
+        if ids:
+            qs = qs.filter(pk__in=ids)
+        else:
+            qs = qs[:max(page_size, 1)]
+        return Response(dict(results=list(qs)))
+
 class JobsHostsList(BaseSubList):
     pass
 
@@ -34,6 +34,7 @@
 
 import json
 import os
+import socket
 import subprocess
 import sys
 
@@ -44,11 +45,28 @@ class CallbackModule(object):
 
     def __init__(self):
         self.callback_script = os.getenv('ACOM_CALLBACK_EVENT_SCRIPT')
+        self.callback_socket = os.getenv('ACOM_CALLBACK_EVENT_SOCKET')
+        self._socket = None
+        self._socket_pid = None
+
+    def _get_socket(self):
+        # Ansible forks worker processes that also call the callback methods;
+        # each process needs its own connection so that lines from different
+        # processes are never interleaved.
+        if self._socket is None or self._socket_pid != os.getpid():
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.callback_socket)
+            self._socket_pid = os.getpid()
+        return self._socket
 
     def _log_event(self, event, **event_data):
-        event_data_json = json.dumps(event_data)
-        cmdline = [self.callback_script, '-e', event, '-d', event_data_json]
-        subprocess.check_call(cmdline)
+        if self.callback_socket:
+            line = json.dumps({'event': event, 'event_data': event_data})
+            self._get_socket().sendall(line + '\n')
+        else:
+            event_data_json = json.dumps(event_data)
+            cmdline = [self.callback_script, '-e', event, '-d', event_data_json]
+            subprocess.check_call(cmdline)
 
     def on_any(self, *args, **kwargs):
         pass
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+# Copyright (c) 2013 AnsibleWorks, Inc.
+# This file is a utility Ansible plugin that is not part of Ansible Commander
+# or Ansible.  It does not import any ansible-commander code, nor does its
+# license apply to Ansible or Ansible Commander.
+# 
+# Copyright (c) 2013, AnsibleWorks Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+#    Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+#    Neither the name of the <ORGANIZATION> nor the names of its contributors
+#    may be used to endorse or promote products derived from this software
+#    without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+'''
+Inventory script that returns an inventory snapshot written to a JSON file
+by Ansible Commander before running ansible-playbook, so that the inventory
+doesn't have to be loaded from the database again.  The path of the file is
+given by the ACOM_INVENTORY_FILE environment variable.
+'''
+
+import json
+from optparse import OptionParser
+import os
+import sys
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--list', action='store_true', dest='list',
+                      default=False, help='Return JSON hash of host groups.')
+    parser.add_option('--host', dest='host', default='',
+                      help='Return JSON hash of host vars.')
+    options, args = parser.parse_args()
+    try:
+        f = open(os.environ['ACOM_INVENTORY_FILE'])
+        try:
+            data = json.load(f)
+        finally:
+            f.close()
+    except (KeyError, IOError, ValueError), e:
+        sys.stdout.write(json.dumps({}))
+        sys.stderr.write('Unable to read inventory file: %s\n' % e)
+        return 1
+    if options.host:
+        hostvars = data.get('_meta', {}).get('hostvars', {})
+        data = hostvars.get(options.host, {})
+    sys.stdout.write(json.dumps(data))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -106,6 +106,10 @@ MEDIA_URL = '/media/'
 # This directory should not be web-accessible.
 PROJECTS_ROOT = os.path.join(BASE_DIR, 'projects')
 
+# Absolute filesystem path to the directory where output from ansible-playbook
+# is written while jobs run.  This directory should not be web-accessible.
+JOBOUTPUT_ROOT = os.path.join(BASE_DIR, 'job_output')
+
 SITE_ID = 1
 
 # Make this unique, and don't share it with anybody.
@@ -187,3 +191,58 @@ CELERYD_TASK_TIME_LIMIT = 600
 CELERYD_TASK_SOFT_TIME_LIMIT = 540
 CELERYBEAT_SCHEDULER = 'djcelery.schedulers.DatabaseScheduler'
 CELERYBEAT_MAX_LOOP_INTERVAL = 60
+
+# Job events received from the callback plugin are written to the database in
+# batches of up to this many events ...
+JOB_EVENT_BATCH_SIZE = 100
+# ... or after this many milliseconds, whichever comes first.
+JOB_EVENT_FLUSH_INTERVAL = 500
+
+# Requests following the events of a job wait up to this many seconds for new
+# events ...
+JOB_EVENT_TAIL_TIMEOUT = 30
+# ... checking the cache for new events every this many milliseconds.  Writing
+# events is noticed through the cache, so requests only wait when CACHES uses
+# a backend shared with the celery workers (e.g. memcached); with the default
+# local memory cache they are answered right away.
+JOB_EVENT_TAIL_POLL_INTERVAL = 250
+
+# Job event data is stored compressed; set this to False to store plain JSON
+# instead (existing events can be read either way).
+JOB_EVENT_DATA_COMPRESSION = True
+# Dicts and lists in job event data of at least this many bytes (e.g. facts)
+# are stored once for all events that include them; 0 disables this.
+JOB_EVENT_DOCUMENT_SIZE = 2048
+
+# Running jobs are notified through a Unix socket in JOBOUTPUT_ROOT when they
+# are canceled, which only works when the web server and the celery worker
+# running the job are on the same host and share JOBOUTPUT_ROOT (and its path
+# is short enough for a socket).  Otherwise, and in case a notification is
+# missed, jobs also check a key set in the cache this often (in seconds),
+# which needs a cache backend shared between them (e.g. memcached) ...
+JOB_CANCEL_POLL_INTERVAL = 2
+# ... and, as a last resort, check for cancellation in the database this
+# often (in seconds).
+JOB_CANCEL_DB_POLL_INTERVAL = 60
+
+# Inventory data passed to ansible-playbook is cached for this many seconds,
+# and rebuilt sooner when hosts, groups or variables change.  Use a cache
+# backend shared between processes (e.g. memcached) to share it between
+# celery workers.
+INVENTORY_CACHE_TIMEOUT = 3600
+
+# Format of the inventory file written for each job: 'json' (read through a
+# small inventory script) or 'ini' (read directly by ansible-playbook, used
+# only when all variables are simple strings).
+INVENTORY_FILE_FORMAT = 'json'
+
+# Access decisions (e.g. whether a user can read an inventory) are remembered
+# for the rest of each request.  Set this to a number of seconds to also
+# share them between requests; only do so with a cache backend shared by all
+# processes, so that changes to permissions, teams or organization admins
+# invalidate cached decisions everywhere.
+ACCESS_CACHE_TIMEOUT = 0
+
+# List requests with filters that take longer than this many milliseconds are
+# logged (with the filters used) as warnings; set to 0 to disable.
+API_SLOW_FILTER_THRESHOLD = 1000
@@ -87,6 +87,9 @@ views_JobTemplateDetail            = views.JobTemplateDetail.as_view()
 views_JobTemplateStart             = views.JobTemplateStart.as_view()
 views_JobsList                     = views.JobsList.as_view()
 views_JobsDetail                   = views.JobsDetail.as_view()
+views_JobsStdout                   = views.JobsStdout.as_view()
+views_JobsEventsTail               = views.JobsEventsTail.as_view()
+views_JobsSummary                  = views.JobsSummary.as_view()
 views_JobsHostsList                = views.JobsHostsList.as_view()
 views_JobsSuccessfulHostsList      = views.JobsSuccessfulHostsList.as_view()
 views_JobsChangedHostsList         = views.JobsChangedHostsList.as_view()
@@ -185,7 +188,10 @@ urlpatterns = patterns('',
     url(r'^api/v1/job_templates/(?P<pk>[0-9]+)/$',                views_JobTemplateDetail),
     url(r'^api/v1/job_templates/(?P<pk>[0-9]+)/start$',           views_JobTemplateStart),
     url(r'^api/v1/jobs/$',                                        views_JobsList),
+    url(r'^api/v1/jobs/summary/$',                                views_JobsSummary),
     url(r'^api/v1/jobs/(?P<pk>[0-9]+)/$',                         views_JobsDetail),
+    url(r'^api/v1/jobs/(?P<pk>[0-9]+)/stdout/$',                  views_JobsStdout),
+    url(r'^api/v1/jobs/(?P<pk>[0-9]+)/job_events/tail/$',         views_JobsEventsTail),
     url(r'^api/v1/jobs/(?P<pk>[0-9]+)/hosts$',                    views_JobsHostsList),
     url(r'^api/v1/jobs/(?P<pk>[0-9]+)/successful_hosts$',         views_JobsSuccessfulHostsList),
     url(r'^api/v1/jobs/(?P<pk>[0-9]+)/changed_hosts$',            views_JobsChangedHostsList),